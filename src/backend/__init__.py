@@ -2,15 +2,15 @@
 
 from __future__ import annotations
 
+import sqlite3
 from pathlib import Path
 from typing import TYPE_CHECKING
 
 from reproca.app import App
-from reproca.code_generation import CodeGenerator
-from reproca.method import methods
 from reproca.sessions import Sessions
 
 from . import env
+from .metrics import Metrics
 
 if TYPE_CHECKING:
     from vald import StringType
@@ -23,7 +23,8 @@ DATABASE = env.variables["DATABASE"]
 print(f"{DEBUG=}, {DATABASE=}")
 
 
-strtypes = []
+# Exported to the front-end by `codegen`.
+strtypes: list[str] = []
 
 
 def export_string_type(name: str, string_type: StringType) -> StringType:
@@ -31,7 +32,9 @@ def export_string_type(name: str, string_type: StringType) -> StringType:
     return string_type
 
 
-sessions: Sessions[int, Session] = Sessions()
+from .session_store import SessionLoader, session_store  # noqa: E402
+
+sessions: Sessions[int, Session] = session_store
 
 
 from . import blog, founder, startup, user  # noqa: E402
@@ -39,30 +42,70 @@ from . import blog, founder, startup, user  # noqa: E402
 __all__ = ["blog", "founder", "startup", "user"]
 
 
-with Path("src/frontend/api.ts").open("w") as file:
-    code_generator = CodeGenerator(file)
-    code_generator.write(
-        """
-        import {type MethodResult, App} from "reproca/app"
-        import {circuitBreakerMiddleware} from "~/query"
-        import {StringType} from "vald/src/index"
-        const app = new App(import.meta.env.VITE_BACKEND, circuitBreakerMiddleware())
-        """,
-    )
-    for strtype in strtypes:
-        code_generator.write(strtype)
-    for method in methods.values():
-        code_generator.method(method)
-    code_generator.resolve()
+app = Metrics(SessionLoader(App(sessions, debug=DEBUG), session_store))
 
 
-app = App(sessions, debug=DEBUG)
+MIGRATIONS = Path("src/backend/migrations")
 
 
 def migrate() -> None:
-    """Migrate the database."""
-    from .db import db  # noqa: PLC0415
-
-    con, cur = db()
-    cur.executescript(Path("src/backend/schema.sql").read_text())
-    con.commit()
+    """Apply pending migrations, tracking progress in PRAGMA user_version.
+
+    Migrations are `NNNN_name.sql` files in `MIGRATIONS`, each runs in its own
+    transaction together with the version bump, so re-running is a no-op.
+    """
+    from .db import maintenance_connection  # noqa: PLC0415
+
+    with maintenance_connection() as con:
+        version = con.execute("PRAGMA user_version").fetchone().user_version
+        for path in sorted(MIGRATIONS.glob("*.sql")):
+            number = int(path.name.split("_", 1)[0])
+            if number <= version:
+                continue
+            try:
+                con.executescript(
+                    f"BEGIN;\n{path.read_text()}\nPRAGMA user_version = {number};\n"
+                    "COMMIT;"
+                )
+            except sqlite3.Error:
+                if con.in_transaction:
+                    con.rollback()
+                raise
+            print(f"Applied migration {path.name}")
+
+
+def repair_follower_counts() -> None:
+    """Migrate the database and recompute follower counts from follower tables."""
+    from .db import maintenance_connection  # noqa: PLC0415
+
+    migrate()
+    with maintenance_connection() as con:
+        con.executescript(
+            """
+            BEGIN;
+            UPDATE User SET FollowerCount = (
+                SELECT COUNT(ID) FROM UserFollower WHERE Following = User.ID
+            );
+            UPDATE Startup SET FollowerCount = (
+                SELECT COUNT(ID) FROM StartupFollower WHERE Following = Startup.ID
+            );
+            COMMIT;
+            """
+        )
+
+
+def check_query_plans() -> None:
+    """Exit with an error if a registered statement scans a table."""
+    from .db import maintenance_connection  # noqa: PLC0415
+    from .statements import find_scans  # noqa: PLC0415
+
+    with maintenance_connection() as con:
+        scans = find_scans(con)
+    for name, steps in scans.items():
+        print(f"{name}: {'; '.join(steps)}")
+    if scans:
+        raise SystemExit(1)
+
+
+if env.variables.get("CHECK_QUERY_PLANS") == "true":
+    check_query_plans()
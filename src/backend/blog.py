@@ -2,16 +2,37 @@
 
 from __future__ import annotations
 
+import json
+import sqlite3
+import unicodedata
 from typing import TYPE_CHECKING
 
 from reproca.method import method
 
-from .db import db
-from .misc import seconds_since_1970
-from .models import Blog, Poll, PollOption, Session
+from . import env
+from .cache import user_cache
+from .db import db, write
+from .misc import MAX_INTEGER, decode_cursor, encode_cursor, seconds_since_1970
+from .models import Blog, BlogMatch, BlogPage, BlogSearchPage, Poll, PollOption, Session
+from .statements import (
+    BLOG_PAGE,
+    BLOG_PAGE_AFTER,
+    DELETE_BLOG,
+    FAN_OUT_BLOG,
+    GET_BLOGS,
+    INSERT_BLOG,
+    INSERT_POLL_OPTION,
+    POLL_OPTIONS,
+    POLL_VOTES,
+    SEARCH_BLOGS,
+    TIMELINE,
+    VOTE_POLL,
+)
 
 if TYPE_CHECKING:
-    from sqlite3 import Cursor
+    from collections.abc import Iterable
+
+    from .db import AsyncCursor
 
 
 @method
@@ -26,120 +47,199 @@ async def post_blog(
         return None
     if poll_options == []:
         poll_options = None
-    con, cur = db()
-    cur.execute(
-        """
-        INSERT INTO Blog (Author, Title, Content, IsPoll, CreatedAt)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        [session.id, title, content, poll_options is not None, seconds_since_1970()],
-    )
-    if poll_options:
-        blog_id = cur.lastrowid
-        cur.executemany(
-            """
-            INSERT INTO PollOption (Blog, Option) VALUES (?, ?)
-            """,
-            ([blog_id, option] for option in poll_options),
+    created_at = seconds_since_1970()
+
+    def post(con: sqlite3.Connection) -> int | None:
+        blog_id = con.execute(
+            INSERT_BLOG,
+            [
+                session.id,
+                title,
+                content,
+                poll_options is not None,
+                created_at,
+            ],
+        ).lastrowid
+        if poll_options:
+            con.executemany(
+                INSERT_POLL_OPTION,
+                [[blog_id, option] for option in poll_options],
+            )
+        con.execute(
+            FAN_OUT_BLOG,
+            [
+                blog_id,
+                created_at,
+                session.id,
+                session.id,
+                FAN_OUT_LIMIT,
+                session.id,
+                blog_id,
+                created_at,
+            ],
         )
-    con.commit()
-    return cur.lastrowid
+        return blog_id
+
+    blog_id = await write(post)
+    user_cache.invalidate(session.id)
+    return blog_id
 
 
 @method
 async def delete_blog(session: Session, blog_id: int) -> None:
     """Delete a blog post."""
-    con, cur = db()
-    cur.execute("DELETE FROM Blog WHERE ID = ? AND Author = ?", [blog_id, session.id])
-    con.commit()
+    await write(lambda con: con.execute(DELETE_BLOG, [blog_id, session.id]))
+    user_cache.invalidate(session.id)
+
+
+MAX_BLOG_PAGE_SIZE = 50
+TIMELINE_PAGE_SIZE = 20
+# Authors with more followers than this are not fanned out on write, their posts
+# are pulled into followers' timelines on read instead.
+FAN_OUT_LIMIT = int(env.variables.get("TIMELINE_FAN_OUT_LIMIT", "10000"))
+# Number of recent posts copied into a timeline when following someone.
+TIMELINE_BACKFILL = 100
+
+
+async def attach_polls(
+    blogs: list[Blog], session: Session | None, cur: AsyncCursor
+) -> list[Blog]:
+    """Replace the IsPoll flag selected by `statements.BLOG_COLUMNS` by the poll."""
+    polls = await get_polls((blog.blog_id for blog in blogs if blog.poll), session, cur)
+    for blog in blogs:
+        blog.poll = polls.get(blog.blog_id)
+    return blogs
 
 
 @method
 async def get_blogs(session: Session | None) -> list[Blog]:
     """Get all blog posts."""
-    _, cur = db()
-    cur.execute(
-        """
-        SELECT
-            B.ID BlogID,
-            B.Author AuthorID,
-            U.Username,
-            U.Name,
-            U.Avatar,
-            (SELECT COUNT(ID) FROM UserFollower WHERE Following = U.ID) FollowerCount,
-            B.Title,
-            B.IsPoll,
-            B.Content,
-            B.CreatedAt
-        FROM Blog B
-        INNER JOIN User U ON B.Author = U.ID
-        ORDER BY B.CreatedAt DESC
-        """
-    )
-    return [
-        Blog(
-            author_id=row.AuthorID,
-            username=row.Username,
-            name=row.Name,
-            avatar=row.Avatar,
-            follower_count=row.FollowerCount,
-            blog_id=row.BlogID,
-            title=row.Title,
-            content=row.Content,
-            poll=get_poll(row.BlogID, session, cur) if row.IsPoll else None,
-            created_at=row.CreatedAt,
+    async with db() as (_, cur):
+        blogs = await cur.fetchall_into(Blog, GET_BLOGS)
+        return await attach_polls(blogs, session, cur)
+
+
+@method
+async def get_blog_page(
+    session: Session | None, cursor: str | None, limit: int
+) -> BlogPage:
+    """Get a page of blog posts, newest first, starting after cursor."""
+    limit = max(1, min(limit, MAX_BLOG_PAGE_SIZE))
+    position = cursor and decode_cursor(cursor, 2)
+    async with db() as (_, cur):
+        if position:
+            blogs = await cur.fetchall_into(
+                Blog,
+                BLOG_PAGE_AFTER,
+                [*position, limit + 1],
+            )
+        else:
+            blogs = await cur.fetchall_into(Blog, BLOG_PAGE, [limit + 1])
+        next_cursor = None
+        if len(blogs) > limit:
+            blogs = blogs[:limit]
+            next_cursor = encode_cursor(blogs[-1].created_at, blogs[-1].blog_id)
+        return BlogPage(
+            blogs=await attach_polls(blogs, session, cur), next_cursor=next_cursor
         )
-        for row in cur.fetchall()
-    ]
-
-
-def get_poll(blog_id: int, session: Session | None, cur: Cursor) -> Poll | None:
-    """Get poll for a blog post."""
-    cur.execute(
-        """
-        SELECT O.ID, O.Option, COUNT(V.ID) Votes
-        FROM PollOption O
-        LEFT JOIN PollVote V ON V.Option = O.ID
-        WHERE O.Blog = ?
-        GROUP BY O.ID
-        """,
-        [blog_id],
+
+
+@method
+async def get_timeline(session: Session, cursor: str | None) -> BlogPage:
+    """Get a page of posts by followed users and self, newest first."""
+    created_at, blog_id = (cursor and decode_cursor(cursor, 2)) or (
+        MAX_INTEGER,
+        MAX_INTEGER,
     )
-    options = [
-        PollOption(id=row.ID, option=row.Option, votes=row.Votes)
-        for row in cur.fetchall()
-    ]
-    my_vote_id = None
-    if session:
-        cur.execute(
-            "SELECT Option FROM PollVote WHERE Blog = ? AND Voter = ?",
-            [blog_id, session.id],
+    async with db() as (_, cur):
+        blogs = await cur.fetchall_into(
+            Blog,
+            TIMELINE,
+            [
+                session.id,
+                created_at,
+                blog_id,
+                session.id,
+                FAN_OUT_LIMIT,
+                created_at,
+                blog_id,
+                TIMELINE_PAGE_SIZE + 1,
+            ],
         )
-        row = cur.fetchone()
-        my_vote_id = row.Option if row else None
-    return Poll(
-        options=options,
-        my_vote_id=my_vote_id,
-    )
+        next_cursor = None
+        if len(blogs) > TIMELINE_PAGE_SIZE:
+            blogs = blogs[:TIMELINE_PAGE_SIZE]
+            next_cursor = encode_cursor(blogs[-1].created_at, blogs[-1].blog_id)
+        return BlogPage(
+            blogs=await attach_polls(blogs, session, cur), next_cursor=next_cursor
+        )
+
+
+SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_TERMS = 16
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+
+
+def match_expression(query: str) -> str | None:
+    """Turn a search box query into an FTS5 expression matching all of its terms.
+
+    Terms are quoted so that FTS5 operators in the query are searched for literally,
+    and the last term matches as a prefix since it may not be fully typed yet.
+    Control characters separate terms, FTS5 rejects some of them inside strings.
+    """
+    query = "".join(" " if unicodedata.category(c)[0] == "C" else c for c in query)
+    terms = ['"{}"'.format(term.replace('"', '""')) for term in query.split()]
+    if not terms:
+        return None
+    terms = terms[:MAX_SEARCH_TERMS]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+@method
+async def search_blogs(
+    session: Session | None, query: str, cursor: str | None
+) -> BlogSearchPage:
+    """Search blog posts by title and content, most relevant first."""
+    expression = match_expression(query)
+    position = decode_cursor(cursor, 1) if cursor else (0,)
+    if expression is None or position is None or position[0] < 0:
+        return BlogSearchPage(blogs=[], next_cursor=None)
+    (offset,) = position
+    async with db() as (_, cur):
+        blogs = await cur.fetchall_into(
+            BlogMatch,
+            SEARCH_BLOGS,
+            [SNIPPET_START, SNIPPET_END, expression, SEARCH_PAGE_SIZE + 1, offset],
+        )
+        next_cursor = None
+        if len(blogs) > SEARCH_PAGE_SIZE:
+            blogs = blogs[:SEARCH_PAGE_SIZE]
+            next_cursor = encode_cursor(offset + SEARCH_PAGE_SIZE)
+        await attach_polls(blogs, session, cur)
+    return BlogSearchPage(blogs=blogs, next_cursor=next_cursor)
+
+
+async def get_polls(
+    blog_ids: Iterable[int], session: Session | None, cur: AsyncCursor
+) -> dict[int, Poll]:
+    """Get polls for many blog posts in two queries, keyed by blog ID."""
+    polls = {blog_id: Poll(options=[], my_vote_id=None) for blog_id in blog_ids}
+    if not polls:
+        return polls
+    ids = json.dumps(list(polls))
+    for row in await cur.fetchall(POLL_OPTIONS, [ids]):
+        polls[row.Blog].options.append(
+            PollOption(id=row.ID, option=row.Option, votes=row.Votes)
+        )
+    if session:
+        for row in await cur.fetchall(POLL_VOTES, [session.id, ids]):
+            polls[row.Blog].my_vote_id = row.Option
+    return polls
 
 
 @method
 async def vote_poll(session: Session, blog_id: int, option_id: int) -> None:
-    """Vote in a poll."""
-    con, cur = db()
-    cur.execute(
-        "SELECT ID FROM PollVote WHERE Blog = ? AND Voter = ?",
-        [blog_id, session.id],
-    )
-    row = cur.fetchone()
-    if row:
-        cur.execute("UPDATE PollVote SET Option = ? WHERE ID = ?", [option_id, row.ID])
-        con.commit()
-        return
-    cur.execute(
-        """
-        INSERT INTO PollVote (Blog, Option, Voter) VALUES (?, ?, ?)
-        """,
-        [blog_id, option_id, session.id],
-    )
-    con.commit()
+    """Vote in a poll, replacing any earlier vote."""
+    await write(lambda con: con.execute(VOTE_POLL, [session.id, option_id, blog_id]))
@@ -0,0 +1,82 @@
+"""In-process caches for pages that change rarely relative to how often they are read.
+
+Caches are per process, so other workers see a change once their entry expires.
+"""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from time import monotonic
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from . import env
+
+if TYPE_CHECKING:
+    from .models import Startup, StartupHandle, User, UserHandle
+
+K = TypeVar("K")
+V = TypeVar("V")
+
+CACHE_SIZE = int(env.variables.get("CACHE_SIZE", "1024"))
+CACHE_TTL = float(env.variables.get("CACHE_TTL", "60"))
+PREFIX_CACHE_SIZE = int(env.variables.get("PREFIX_CACHE_SIZE", "4096"))
+PREFIX_CACHE_TTL = float(env.variables.get("PREFIX_CACHE_TTL", "10"))
+
+
+class LRUCache(Generic[K, V]):
+    """Bounded least-recently-used cache whose entries expire after a TTL."""
+
+    def __init__(self, size: int, ttl: float) -> None:
+        """Initialize the cache."""
+        self.size = size
+        self.ttl = ttl
+        self.entries: OrderedDict[K, tuple[float, V]] = OrderedDict()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: K) -> V | None:
+        """Return the cached value, or None if it is missing or expired."""
+        entry = self.entries.get(key)
+        if entry is None or entry[0] < monotonic():
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def set(self, key: K, value: V, generation: int, ttl: float | None = None) -> None:
+        """Store a value read when the cache was at `generation`.
+
+        The value is dropped if anything was invalidated since, because it may have
+        been read before the change was committed. `ttl` shortens the cache's TTL for
+        values that stop being valid sooner.
+        """
+        if generation != self.generation:
+            return
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self.entries[key] = (monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.size:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, *keys: K) -> None:
+        """Remove entries, call after the change is committed."""
+        self.generation += 1
+        for key in keys:
+            self.entries.pop(key, None)
+
+
+# Usernames never change, so this maps them to user IDs without invalidation.
+user_ids: LRUCache[str, int] = LRUCache(CACHE_SIZE, CACHE_TTL)
+# Viewer-independent parts of get_user and get_startup, keyed by ID.
+user_cache: LRUCache[int, User] = LRUCache(CACHE_SIZE, CACHE_TTL)
+startup_cache: LRUCache[int, Startup] = LRUCache(CACHE_SIZE, CACHE_TTL)
+# Prefix search results, not invalidated since a few seconds of staleness is fine
+# for autocomplete.
+user_prefixes: LRUCache[str, list[UserHandle]] = LRUCache(
+    PREFIX_CACHE_SIZE, PREFIX_CACHE_TTL
+)
+startup_prefixes: LRUCache[str, list[StartupHandle]] = LRUCache(
+    PREFIX_CACHE_SIZE, PREFIX_CACHE_TTL
+)
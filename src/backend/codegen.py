@@ -0,0 +1,72 @@
+"""Generate the front-end bindings in `src/frontend/api.ts`.
+
+Run with `rye run codegen` after changing a method, a model or an exported string
+type. The file starts with a fingerprint of everything it is generated from, and is
+left untouched while the fingerprint matches.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import inspect
+import io
+from importlib.metadata import version
+from pathlib import Path
+
+from reproca.code_generation import CodeGenerator
+from reproca.method import methods
+
+from . import models, strtypes
+
+API = Path("src/frontend/api.ts")
+FINGERPRINT = "// fingerprint: "
+HEADER = """
+        import {type MethodResult, App} from "reproca/app"
+        import {circuitBreakerMiddleware} from "~/query"
+        import {StringType} from "vald/src/index"
+        const app = new App(import.meta.env.VITE_BACKEND, circuitBreakerMiddleware())
+        """
+
+
+def fingerprint() -> str:
+    """Hash the method signatures, models and exported string types."""
+    digest = hashlib.sha256()
+    digest.update(version("reproca").encode())
+    digest.update(HEADER.encode())
+    # Signatures refer to structs by name, their fields are in the models source.
+    digest.update(inspect.getsource(models).encode())
+    for strtype in strtypes:
+        digest.update(strtype.encode())
+    for method in methods.values():
+        func = method.func
+        signature = inspect.signature(func)
+        digest.update(f"{func.__module__}.{func.__qualname__}{signature}\n".encode())
+    return digest.hexdigest()
+
+
+def generate() -> str:
+    """Return the contents of `api.ts`."""
+    file = io.StringIO()
+    code_generator = CodeGenerator(file)
+    code_generator.write(HEADER)
+    for strtype in strtypes:
+        code_generator.write(strtype)
+    for method in methods.values():
+        code_generator.method(method)
+    code_generator.resolve()
+    return file.getvalue()
+
+
+def main() -> None:
+    """Regenerate `api.ts` if its fingerprint changed."""
+    expected = f"{FINGERPRINT}{fingerprint()}\n"
+    if API.exists():
+        with API.open() as file:
+            if file.readline() == expected:
+                print(f"{API} is up to date")
+                return
+    # Replace the file in one step so the dev server never reads half of it.
+    temporary = API.with_suffix(".ts.tmp")
+    temporary.write_text(expected + generate())
+    temporary.replace(API)
+    print(f"Generated {API}")
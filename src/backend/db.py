@@ -2,72 +2,571 @@
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import queue
 import sqlite3
-from typing import Any
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from operator import itemgetter
+from time import monotonic, perf_counter, sleep
+from typing import TYPE_CHECKING, Any, Callable, ClassVar, TypeVar
 
-from . import DATABASE
+from . import DATABASE, env
+from .metrics import request_stats
+from .slow_queries import SLOW_QUERY_SECONDS
+from .slow_queries import log as log_slow_query
+from .slow_queries import log_write as log_slow_write
 
+if TYPE_CHECKING:
+    from collections.abc import AsyncGenerator, Generator, Iterable, Sequence
 
-class Row:
-    """Represents a row in the database."""
+    from msgspec import Struct
 
-    def __init__(
-        self,
-        cursor: sqlite3.Cursor,
-        row: tuple[int | float | str | bytes | None, ...],
-    ) -> None:
-        """Initialize the Row object.
+T = TypeVar("T")
+S = TypeVar("S", bound="Struct")
 
-        Args:
-        ----
-            cursor: The database cursor.
-            row: The row data.
+POOL_SIZE = int(env.variables.get("DATABASE_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(env.variables.get("DATABASE_POOL_TIMEOUT", "30"))
+# Seconds the writer waits for more writes to commit together with the first one.
+WRITE_BATCH_DELAY = float(env.variables.get("DATABASE_WRITE_BATCH_DELAY", "0.001"))
+WRITE_BATCH_SIZE = int(env.variables.get("DATABASE_WRITE_BATCH_SIZE", "256"))
+# Times the writer retries taking the write lock from another process, each attempt
+# waits for SQLite's busy timeout first.
+WRITE_BUSY_RETRIES = int(env.variables.get("DATABASE_WRITE_BUSY_RETRIES", "3"))
+PRAGMAS = """
+PRAGMA foreign_keys = ON;
+PRAGMA journal_mode = WAL;
+PRAGMA synchronous = normal;
+PRAGMA journal_size_limit = 6144000;
+"""
 
-        """
-        fields = [column[0] for column in cursor.description]
-        self.row = dict(zip(fields, row))
 
-    def __getattr__(self, key: str) -> Any:  # noqa: ANN401
-        """Get attribute value by key.
+class Row(tuple[Any, ...]):
+    """Represents a row in the database.
 
-        Args:
-        ----
-            key: The attribute key.
+    Rows are plain tuples, columns are read through properties on a subclass made
+    once per distinct column layout by `row_layout`.
+    """
+
+    __slots__ = ()
+    fields: ClassVar[tuple[str, ...]] = ()
 
-        Returns: The attribute value.
+    def __getattr__(self, key: str) -> Any:  # noqa: ANN401
+        """Raise AttributeError for columns missing from the row.
 
-        Raises:
+        Raises
         ------
-            AttributeError: If the attribute key is not found.
+            AttributeError: Always, known columns never reach this method.
 
         """
-        try:
-            return self.row[key]
-        except KeyError:
-            raise AttributeError(key) from None
+        raise AttributeError(key)
 
     def __repr__(self) -> str:
         """Return a string representation of the Row object."""
-        return repr(self.row)
+        return repr(dict(zip(self.fields, self)))
 
     def __str__(self) -> str:
         """Return a string representation of the Row object."""
-        return str(self.row)
+        return str(dict(zip(self.fields, self)))
+
+
+layouts: dict[tuple[tuple[Any, ...], ...], type[Row]] = {}
+
 
+def row_layout(description: tuple[tuple[Any, ...], ...]) -> type[Row]:
+    """Return the Row subclass for a cursor description, creating it once."""
+    layout = layouts.get(description)
+    if layout is None:
+        fields = tuple(column[0] for column in description)
+        namespace: dict[str, Any] = {"__slots__": (), "fields": fields}
+        for index, field in enumerate(fields):
+            namespace.setdefault(field, property(itemgetter(index)))
+        layout = layouts.setdefault(description, type("Row", (Row,), namespace))
+    return layout
 
-def db() -> tuple[sqlite3.Connection, sqlite3.Cursor]:
-    """Connect to the database and return the connection and cursor objects.
 
-    Returns: The connection and cursor objects.
+class RowFactory:
+    """Row factory remembering the layout of the last description it saw.
+
+    A cursor keeps the same description object for every row of a result, so an
+    identity check avoids hashing the description per row.
     """
-    con = sqlite3.connect(DATABASE)
-    con.row_factory = Row
-    con.executescript(
+
+    __slots__ = ("last",)
+
+    def __init__(self) -> None:
+        """Initialize the row factory."""
+        self.last: tuple[Any, type[Row]] = (None, Row)
+
+    def __call__(self, cursor: sqlite3.Cursor, row: tuple[Any, ...]) -> Row:
+        """Wrap a fetched tuple in the Row subclass for its column layout."""
+        description, layout = self.last
+        if cursor.description is not description:
+            description = cursor.description
+            layout = row_layout(description)
+            self.last = (description, layout)
+        return layout(row)
+
+
+row_factory = RowFactory()
+
+
+def fetchall_into(
+    cursor: sqlite3.Cursor,
+    struct: type[S],
+    sql: str,
+    parameters: Sequence[Any],
+) -> list[S]:
+    """Execute a query and build one struct per row, skipping Row objects.
+
+    Columns must be aliased to the struct's field names, in field order.
+
+    Raises
+    ------
+        ValueError: If the columns do not match the struct's fields.
+
+    """
+    cursor.row_factory = None
+    try:
+        rows = cursor.execute(sql, parameters).fetchall()
+    finally:
+        cursor.row_factory = row_factory
+    columns = tuple(column[0] for column in cursor.description)
+    if columns != struct.__struct_fields__:
+        msg = f"Columns {columns} do not match {struct.__name__} fields."
+        raise ValueError(msg)
+    return [struct(*row) for row in rows]
+
+
+def connect(database: str) -> sqlite3.Connection:
+    """Open a new connection and apply the PRAGMAs once."""
+    con = sqlite3.connect(database, check_same_thread=False)
+    con.row_factory = row_factory
+    con.executescript(PRAGMAS)
+    return con
+
+
+@contextmanager
+def maintenance_connection() -> Generator[sqlite3.Connection, None, None]:
+    """Open a writable connection for commands that run outside of the app."""
+    con = connect(DATABASE)
+    try:
+        yield con
+    finally:
+        con.close()
+
+
+class Pool:
+    """Bounded pool of pre-configured read-only database connections."""
+
+    def __init__(self, database: str, size: int, timeout: float) -> None:
+        """Initialize the pool, connections are opened lazily.
+
+        Args:
+        ----
+            database: Path to the database file.
+            size: Maximum number of connections open at once.
+            timeout: Seconds to wait for a free connection before giving up.
+
         """
-        PRAGMA foreign_keys = ON;
-        PRAGMA journal_mode = WAL;
-        PRAGMA synchronous = normal;
-        PRAGMA journal_size_limit = 6144000;
+        self.database = database
+        self.timeout = timeout
+        self.idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self.slots = threading.BoundedSemaphore(size)
+
+    def connect(self) -> sqlite3.Connection:
+        """Open a new connection that refuses writes, they go through `writer`."""
+        con = connect(self.database)
+        con.execute("PRAGMA query_only = ON")
+        return con
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check out a healthy connection, opening one if none are idle.
+
+        Raises
+        ------
+            TimeoutError: If every connection stays checked out for `timeout`.
+
         """
-    )
-    return con, con.cursor()
+        if not self.slots.acquire(timeout=self.timeout):
+            msg = "Timed out waiting for a database connection."
+            raise TimeoutError(msg)
+        try:
+            while True:
+                try:
+                    con = self.idle.get_nowait()
+                except queue.Empty:
+                    return self.connect()
+                if is_healthy(con):
+                    return con
+                con.close()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self, con: sqlite3.Connection) -> None:
+        """Return a connection to the pool, discarding it if it is broken."""
+        try:
+            if con.in_transaction:
+                con.rollback()
+        except sqlite3.Error:
+            con.close()
+        else:
+            self.idle.put(con)
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def connection(self) -> Generator[sqlite3.Connection, None, None]:
+        """Check out a connection for the duration of the block."""
+        con = self.acquire()
+        try:
+            yield con
+        finally:
+            self.release(con)
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def is_healthy(con: sqlite3.Connection) -> bool:
+    """Return true if the connection can still run statements."""
+    try:
+        con.execute("SELECT 1").fetchone()
+    except sqlite3.Error:
+        return False
+    return True
+
+
+pool = Pool(DATABASE, POOL_SIZE, POOL_TIMEOUT)
+atexit.register(pool.close)
+
+
+class Writer:
+    """Thread that owns the only writable connection and runs every write on it.
+
+    Writes submitted while the writer is busy, or within `delay` of the first one,
+    are committed in a single transaction. Each runs in its own savepoint, so one
+    that raises is rolled back and fails alone.
+    """
+
+    def __init__(self, database: str, delay: float, size: int, retries: int) -> None:
+        """Initialize the writer, its thread starts on the first write."""
+        self.database = database
+        self.delay = delay
+        self.size = size
+        self.retries = retries
+        self.queue: queue.SimpleQueue[
+            tuple[Callable[[sqlite3.Connection], Any], Future[Any]] | None
+        ] = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.thread: threading.Thread | None = None
+
+    def submit(self, function: Callable[[sqlite3.Connection], T]) -> Future[T]:
+        """Queue a write, it must not commit or roll back by itself."""
+        future: Future[T] = Future()
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(
+                    target=self.run, name="db-writer", daemon=True
+                )
+                self.thread.start()
+        self.queue.put((function, future))
+        return future
+
+    def run(self) -> None:
+        """Commit batches of writes until `close` is called."""
+        con = connect(self.database)
+        con.isolation_level = None
+        try:
+            while (item := self.queue.get()) is not None:
+                batch = [item]
+                deadline = monotonic() + self.delay
+                while len(batch) < self.size:
+                    try:
+                        item = self.queue.get(timeout=max(deadline - monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is None:
+                        self.queue.put(None)
+                        break
+                    batch.append(item)
+                self.commit(con, batch)
+        finally:
+            con.close()
+
+    def begin(self, con: sqlite3.Connection) -> None:
+        """Take the write lock, retrying while another process holds it.
+
+        Raises
+        ------
+            sqlite3.OperationalError: If the lock is still held after every retry.
+
+        """
+        for attempt in range(self.retries + 1):
+            try:
+                con.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError as error:
+                if "locked" not in str(error) or attempt == self.retries:
+                    raise
+                sleep(0.05 * 2**attempt)
+            else:
+                return
+
+    def commit(
+        self,
+        con: sqlite3.Connection,
+        batch: list[tuple[Callable[[sqlite3.Connection], Any], Future[Any]]],
+    ) -> None:
+        """Run a batch of writes in one transaction, then resolve their futures."""
+        outcomes: list[tuple[Future[Any], Any, BaseException | None]] = []
+        try:
+            self.begin(con)
+            for function, future in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                con.execute("SAVEPOINT write")
+                try:
+                    outcomes.append((future, function(con), None))
+                except Exception as error:  # noqa: BLE001
+                    con.execute("ROLLBACK TO write")
+                    outcomes.append((future, None, error))
+                con.execute("RELEASE write")
+            con.execute("COMMIT")
+        except Exception as error:  # noqa: BLE001
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+            # Fail every write of the batch, including those that never started.
+            for _, future in batch:
+                if future.done():
+                    continue
+                if future.running() or future.set_running_or_notify_cancel():
+                    future.set_exception(error)
+            return
+        for future, result, error in outcomes:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def close(self) -> None:
+        """Finish queued writes and stop the thread."""
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+
+
+writer = Writer(DATABASE, WRITE_BATCH_DELAY, WRITE_BATCH_SIZE, WRITE_BUSY_RETRIES)
+atexit.register(writer.close)
+
+
+executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="db")
+atexit.register(executor.shutdown)
+limiter = asyncio.Semaphore(POOL_SIZE)
+
+
+async def run(function: Callable[..., T], *args: Any) -> T:  # noqa: ANN401
+    """Run a blocking function on the database executor."""
+    return await asyncio.get_running_loop().run_in_executor(executor, function, *args)
+
+
+async def write(function: Callable[[sqlite3.Connection], T]) -> T:
+    """Run a write on the writer thread and return its result once committed.
+
+    Writes taking `SLOW_QUERY_SECONDS` or more, waiting for the commit included, are
+    logged with their function's name.
+
+    Raises
+    ------
+        Exception: Whatever `function` raised, its changes are rolled back.
+        sqlite3.Error: If the batch it was committed with failed to commit.
+
+    """
+    stats = request_stats.get()
+    ran = 0.0
+    statements = 0
+
+    def trace(_: str) -> None:
+        nonlocal statements
+        statements += 1
+
+    def measured(con: sqlite3.Connection) -> T:
+        nonlocal ran
+        con.set_trace_callback(trace)
+        start = perf_counter()
+        try:
+            return function(con)
+        finally:
+            ran = perf_counter() - start
+            con.set_trace_callback(None)
+
+    start = perf_counter()
+    try:
+        return await asyncio.wrap_future(writer.submit(measured))
+    finally:
+        waited = perf_counter() - start - ran
+        if stats is not None:
+            stats.queries += statements
+            stats.sqlite_seconds += ran
+            stats.commit_seconds += waited
+        if ran + waited >= SLOW_QUERY_SECONDS:
+            name = getattr(function, "__qualname__", repr(function))
+            log_slow_write(name, statements, ran, waited, stats)
+
+
+def timed(function: Callable[[], T]) -> tuple[T, float]:
+    """Call a function and return its result and duration."""
+    start = perf_counter()
+    result = function()
+    return result, perf_counter() - start
+
+
+class AsyncCursor:
+    """Cursor whose statements run on the database executor."""
+
+    def __init__(self, cursor: sqlite3.Cursor) -> None:
+        """Wrap a cursor."""
+        self.cursor = cursor
+
+    @property
+    def lastrowid(self) -> int | None:
+        """Row ID of the last inserted row."""
+        return self.cursor.lastrowid
+
+    @property
+    def rowcount(self) -> int:
+        """Number of rows changed by the last statement."""
+        return self.cursor.rowcount
+
+    async def run(
+        self,
+        function: Callable[[], T],
+        sql: str,
+        parameters: Sequence[Any] | None,
+        rows: Callable[[T], int],
+    ) -> T:
+        """Run a statement on the executor, recording it in the request's stats.
+
+        Statements slower than `SLOW_QUERY_SECONDS` are written to the slow query log.
+        """
+        result, seconds = await run(timed, function)
+        count = rows(result)
+        stats = request_stats.get()
+        if stats is not None:
+            stats.queries += 1
+            stats.rows += count
+            stats.sqlite_seconds += seconds
+        if seconds >= SLOW_QUERY_SECONDS:
+            await run(
+                log_slow_query,
+                self.cursor.connection,
+                sql,
+                parameters,
+                count,
+                seconds,
+                stats,
+            )
+        return result
+
+    async def execute(self, sql: str, parameters: Sequence[Any] = ()) -> None:
+        """Execute a statement."""
+        await self.run(
+            lambda: self.cursor.execute(sql, parameters), sql, parameters, no_rows
+        )
+
+    async def executemany(self, sql: str, parameters: Iterable[Sequence[Any]]) -> None:
+        """Execute a statement once for every set of parameters."""
+        await self.run(
+            lambda: self.cursor.executemany(sql, parameters), sql, None, no_rows
+        )
+
+    async def fetchone(
+        self,
+        sql: str,
+        parameters: Sequence[Any] = (),
+    ) -> Any:  # noqa: ANN401
+        """Execute a query and return its first row, or None."""
+        return await self.run(
+            lambda: self.cursor.execute(sql, parameters).fetchone(),
+            sql,
+            parameters,
+            lambda row: int(row is not None),
+        )
+
+    async def fetchall(self, sql: str, parameters: Sequence[Any] = ()) -> list[Any]:
+        """Execute a query and return all of its rows."""
+        return await self.run(
+            lambda: self.cursor.execute(sql, parameters).fetchall(),
+            sql,
+            parameters,
+            len,
+        )
+
+    async def fetchall_into(
+        self, struct: type[S], sql: str, parameters: Sequence[Any] = ()
+    ) -> list[S]:
+        """Execute a query and build one struct per row, see `fetchall_into`."""
+        return await self.run(
+            lambda: fetchall_into(self.cursor, struct, sql, parameters),
+            sql,
+            parameters,
+            len,
+        )
+
+
+def no_rows(_: object) -> int:
+    """Count no rows for statements that do not return any."""
+    return 0
+
+
+class AsyncConnection:
+    """Connection whose transaction control runs on the database executor."""
+
+    def __init__(self, con: sqlite3.Connection) -> None:
+        """Wrap a connection."""
+        self.con = con
+
+    async def commit(self) -> None:
+        """Commit the current transaction."""
+        await run(self.con.commit)
+
+    async def rollback(self) -> None:
+        """Roll back the current transaction."""
+        await run(self.con.rollback)
+
+
+def release_acquired(acquiring: asyncio.Future[sqlite3.Connection]) -> None:
+    """Return a connection whose `db()` was cancelled while it was checked out."""
+    if not acquiring.cancelled() and acquiring.exception() is None:
+        pool.release(acquiring.result())
+
+
+@asynccontextmanager
+async def db() -> AsyncGenerator[tuple[AsyncConnection, AsyncCursor], None]:
+    """Check out a pooled connection and yield async connection and cursor wrappers.
+
+    At most `POOL_SIZE` coroutines hold a connection at once, the rest wait here
+    without occupying an executor thread. Nothing else checks out of `pool`, so once
+    past the limiter a slot is free. `acquire` still runs on the executor since it
+    may open a connection or check an idle one's health.
+    Uncommitted changes are rolled back when the connection is returned.
+    """
+    async with limiter:
+        acquiring = asyncio.ensure_future(run(pool.acquire))
+        try:
+            con = await asyncio.shield(acquiring)
+        except asyncio.CancelledError:
+            # The connection is still checked out on the executor, return it after.
+            acquiring.add_done_callback(release_acquired)
+            raise
+        try:
+            yield AsyncConnection(con), AsyncCursor(con.cursor())
+        finally:
+            await asyncio.shield(run(pool.release, con))
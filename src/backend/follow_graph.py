@@ -0,0 +1,250 @@
+"""In-memory index of who follows whom, answering follow lookups without queries.
+
+Each process loads the follower tables on first use. Its own follows are applied
+as they are committed, other workers' follows are read from `FollowChange` at most
+`FOLLOW_GRAPH_SYNC` seconds later.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+from array import array
+from bisect import bisect_left
+from time import monotonic
+from typing import TYPE_CHECKING
+
+from . import DATABASE, env
+from .db import POOL_TIMEOUT, Pool, run
+from .statements import (
+    FOLLOW_CHANGES,
+    LAST_FOLLOW_CHANGE,
+    STARTUP_FOLLOWS,
+    USER_FOLLOWS,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+# Seconds between reads of other workers' follows.
+FOLLOW_GRAPH_SYNC = float(env.variables.get("FOLLOW_GRAPH_SYNC", "1"))
+# Mutual followers shown on a profile, `USER_MUTUALS` has a placeholder for each.
+MUTUALS_LIMIT = 4
+EMPTY: array[int] = array("q")
+# Refreshes are serialized by the graph's lock, so one connection is enough. It is
+# not taken from `db.pool`, whose slots are only for `db()` under its limiter.
+pool = Pool(DATABASE, 1, POOL_TIMEOUT)
+atexit.register(pool.close)
+
+
+def contains(ids: array[int], id_: int) -> bool:
+    """Check if a sorted array contains an ID."""
+    index = bisect_left(ids, id_)
+    return index < len(ids) and ids[index] == id_
+
+
+def intersect(a: array[int], b: array[int], limit: int) -> list[int]:
+    """Return up to `limit` IDs in both sorted arrays, smallest first.
+
+    The smaller array is walked and looked up in the larger one, so a profile with
+    millions of followers costs a few binary searches per account the viewer follows.
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    found: list[int] = []
+    low = 0
+    for id_ in a:
+        low = bisect_left(b, id_, low)
+        if low == len(b):
+            break
+        if b[low] == id_:
+            found.append(id_)
+            if len(found) == limit:
+                break
+    return found
+
+
+class Adjacency:
+    """Sorted array of neighbour IDs per node."""
+
+    def __init__(self) -> None:
+        """Initialize an empty adjacency."""
+        self.edges: dict[int, array[int]] = {}
+
+    @classmethod
+    def build(cls, pairs: Iterable[tuple[int, int]]) -> Adjacency:
+        """Build from (node, neighbour) pairs in any order."""
+        lists: dict[int, list[int]] = {}
+        for node, neighbour in pairs:
+            if (neighbours := lists.get(node)) is None:
+                neighbours = lists[node] = []
+            neighbours.append(neighbour)
+        adjacency = cls()
+        adjacency.edges = {
+            node: array("q", sorted(neighbours)) for node, neighbours in lists.items()
+        }
+        return adjacency
+
+    def get(self, node: int) -> array[int]:
+        """Return the sorted neighbours of a node, do not modify the result."""
+        return self.edges.get(node, EMPTY)
+
+    def count(self, node: int) -> int:
+        """Return the number of neighbours of a node."""
+        return len(self.edges.get(node, EMPTY))
+
+    def contains(self, node: int, neighbour: int) -> bool:
+        """Check if an edge exists."""
+        return contains(self.edges.get(node, EMPTY), neighbour)
+
+    def add(self, node: int, neighbour: int) -> None:
+        """Add an edge if it is missing."""
+        if (neighbours := self.edges.get(node)) is None:
+            self.edges[node] = array("q", [neighbour])
+            return
+        index = bisect_left(neighbours, neighbour)
+        if index == len(neighbours) or neighbours[index] != neighbour:
+            neighbours.insert(index, neighbour)
+
+    def discard(self, node: int, neighbour: int) -> None:
+        """Remove an edge if it exists."""
+        neighbours = self.edges.get(node, EMPTY)
+        index = bisect_left(neighbours, neighbour)
+        if index < len(neighbours) and neighbours[index] == neighbour:
+            del neighbours[index]
+            if not neighbours:
+                del self.edges[node]
+
+
+class FollowGraph:
+    """Followers and followings of users, and followers of startups."""
+
+    def __init__(self, sync: float) -> None:
+        """Initialize an empty graph, it is loaded on the first read."""
+        self.sync = sync
+        self.user_followers = Adjacency()
+        self.user_following = Adjacency()
+        self.startup_followers = Adjacency()
+        self.startup_following = Adjacency()
+        # ID of the last applied `FollowChange`, None until loaded.
+        self.change: int | None = None
+        self.synced_at = float("-inf")
+        self.lock = asyncio.Lock()
+
+    async def fresh(self) -> FollowGraph:
+        """Load or catch up with other workers' follows if due, return the graph."""
+        if self.synced_at + self.sync < monotonic():
+            async with self.lock:
+                if self.synced_at + self.sync < monotonic():
+                    await self.refresh()
+        return self
+
+    async def refresh(self) -> None:
+        """Apply follow changes since the last refresh, or load the whole graph.
+
+        Queries run on the db executor, the graph is only modified on the event loop.
+        """
+        changes = None if self.change is None else await run(read_changes, self.change)
+        if changes is None:
+            (
+                self.change,
+                self.user_following,
+                self.user_followers,
+                self.startup_following,
+                self.startup_followers,
+            ) = await run(read_graph)
+        else:
+            for change, startup, follower, following, followed in changes:
+                if startup:
+                    self.set_startup(follower, following, followed=bool(followed))
+                else:
+                    self.set_user(follower, following, followed=bool(followed))
+                self.change = change
+        self.synced_at = monotonic()
+
+    def set_user(self, follower: int, following: int, *, followed: bool) -> None:
+        """Record a committed user follow or unfollow."""
+        if followed:
+            self.user_following.add(follower, following)
+            self.user_followers.add(following, follower)
+        else:
+            self.user_following.discard(follower, following)
+            self.user_followers.discard(following, follower)
+
+    def set_startup(self, follower: int, startup: int, *, followed: bool) -> None:
+        """Record a committed startup follow or unfollow."""
+        if followed:
+            self.startup_following.add(follower, startup)
+            self.startup_followers.add(startup, follower)
+        else:
+            self.startup_following.discard(follower, startup)
+            self.startup_followers.discard(startup, follower)
+
+    def is_following_user(self, follower: int, following: int) -> bool:
+        """Check if a user follows another."""
+        return self.user_following.contains(follower, following)
+
+    def is_following_startup(self, follower: int, startup: int) -> bool:
+        """Check if a user follows a startup."""
+        return self.startup_following.contains(follower, startup)
+
+    def user_mutuals(self, user_id: int, viewer: int) -> list[int]:
+        """Return followers of a user that the viewer follows."""
+        return intersect(
+            self.user_followers.get(user_id),
+            self.user_following.get(viewer),
+            MUTUALS_LIMIT,
+        )
+
+    def startup_mutuals(self, startup_id: int, viewer: int) -> list[int]:
+        """Return followers of a startup that the viewer follows."""
+        return intersect(
+            self.startup_followers.get(startup_id),
+            self.user_following.get(viewer),
+            MUTUALS_LIMIT,
+        )
+
+
+def read_changes(after: int) -> list[tuple[int, int, int, int, int]] | None:
+    """Return follow changes after an ID, or None if some were already pruned."""
+    with pool.connection() as con:
+        cursor = con.cursor()
+        cursor.row_factory = None
+        changes = cursor.execute(FOLLOW_CHANGES, [after]).fetchall()
+    if changes and changes[0][0] != after + 1:
+        return None
+    return changes
+
+
+def read_graph() -> tuple[int, Adjacency, Adjacency, Adjacency, Adjacency]:
+    """Return the last change ID and the adjacencies built from the follower tables.
+
+    Returned as (change, user following, user followers, startup following,
+    startup followers).
+    """
+    with pool.connection() as con:
+        cursor = con.cursor()
+        cursor.row_factory = None
+        # One read transaction, so the change ID matches the tables.
+        cursor.execute("BEGIN")
+        try:
+            (change,) = cursor.execute(LAST_FOLLOW_CHANGE).fetchone()
+            users = cursor.execute(USER_FOLLOWS).fetchall()
+            startups = cursor.execute(STARTUP_FOLLOWS).fetchall()
+        finally:
+            con.rollback()
+    return (
+        change,
+        Adjacency.build(users),
+        Adjacency.build((b, a) for a, b in users),
+        Adjacency.build(startups),
+        Adjacency.build((b, a) for a, b in startups),
+    )
+
+
+def mutual_parameters(id_: int, mutuals: list[int]) -> list[int | None]:
+    """Return parameters of `USER_MUTUALS` or `STARTUP_MUTUALS`, padded with NULLs."""
+    return [id_, *mutuals, *[None] * (MUTUALS_LIMIT - len(mutuals))]
+
+
+follow_graph = FollowGraph(FOLLOW_GRAPH_SYNC)
@@ -7,10 +7,12 @@ import sqlite3
 
 from reproca.method import method
 
-from .db import db
+from .cache import startup_cache, user_cache
+from .db import write
 from .misc import seconds_since_1970
 from .models import BIO, Session
 from .startup import is_startup_founded_by
+from .statements import ADD_FOUNDER, COUNT_FOUNDERS, EDIT_FOUNDER, REMOVE_FOUNDER
 
 
 @method
@@ -24,18 +26,21 @@ async def add_founder(
     """Fails if startup is not founded by current user."""
     if BIO.is_invalid(keynote):
         return
-    con, cur = db()
-    if not is_startup_founded_by(cur, startup_id, session.id):
+
+    def add(con: sqlite3.Connection) -> bool:
+        if not is_startup_founded_by(con, startup_id, session.id):
+            return False
+        with contextlib.suppress(sqlite3.IntegrityError):
+            con.execute(
+                ADD_FOUNDER,
+                [startup_id, founder_id, keynote, founded_at, seconds_since_1970()],
+            )
+        return True
+
+    if not await write(add):
         return
-    with contextlib.suppress(sqlite3.IntegrityError):
-        cur.execute(
-            """
-        INSERT INTO Founder (Startup, Founder, Keynote, FoundedAt, CreatedAt)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-            [startup_id, founder_id, keynote, founded_at, seconds_since_1970()],
-        )
-    con.commit()
+    startup_cache.invalidate(startup_id)
+    user_cache.invalidate(founder_id)
 
 
 @method
@@ -49,29 +54,32 @@ async def edit_founder(
     """Edit a founder."""
     if BIO.is_invalid(keynote):
         return
-    con, cur = db()
-    if not is_startup_founded_by(cur, startup_id, session.id):
+
+    def edit(con: sqlite3.Connection) -> bool:
+        if not is_startup_founded_by(con, startup_id, session.id):
+            return False
+        con.execute(EDIT_FOUNDER, [keynote, founded_at, startup_id, founder_id])
+        return True
+
+    if not await write(edit):
         return
-    cur.execute(
-        """
-        UPDATE Founder SET Keynote = ?, FoundedAt = ? WHERE Startup = ? AND Founder = ?
-        """,
-        [keynote, founded_at, startup_id, founder_id],
-    )
-    con.commit()
+    startup_cache.invalidate(startup_id)
+    user_cache.invalidate(founder_id)
 
 
 @method
 async def remove_founder(session: Session, startup_id: int, founder_id: int) -> None:
     """Remove a founder from a startup, only founders can remove other founders."""
-    con, cur = db()
-    if not is_startup_founded_by(cur, startup_id, session.id):
-        return
-    cur.execute("SELECT COUNT(ID) Count FROM Founder WHERE Startup = ?", [startup_id])
-    if cur.fetchone().Count == 1:
+
+    def remove(con: sqlite3.Connection) -> bool:
+        if not is_startup_founded_by(con, startup_id, session.id):
+            return False
+        if con.execute(COUNT_FOUNDERS, [startup_id]).fetchone().Count == 1:
+            return False
+        con.execute(REMOVE_FOUNDER, [startup_id, founder_id])
+        return True
+
+    if not await write(remove):
         return
-    cur.execute(
-        "DELETE FROM Founder WHERE Startup = ? AND Founder = ?",
-        [startup_id, founder_id],
-    )
-    con.commit()
+    startup_cache.invalidate(startup_id)
+    user_cache.invalidate(founder_id)
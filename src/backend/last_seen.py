@@ -0,0 +1,69 @@
+"""Coalesced LastSeenAt updates."""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+
+from . import env
+from .db import write, writer
+from .statements import UPDATE_LAST_SEEN
+
+# Seconds between flushes of recorded last-seen times to the database.
+FLUSH_INTERVAL = float(env.variables.get("LAST_SEEN_FLUSH_INTERVAL", "30"))
+# A user seen again within this many seconds is not recorded at all.
+GRANULARITY = int(env.variables.get("LAST_SEEN_GRANULARITY", "60"))
+
+
+class LastSeen:
+    """Last-seen times recorded in memory and written in one batch per interval."""
+
+    def __init__(self, interval: float) -> None:
+        """Initialize the recorder, the flush task starts on the first record."""
+        self.interval = interval
+        self.pending: dict[int, int] = {}
+        self.task: asyncio.Task[None] | None = None
+
+    def record(self, user_id: int, seen_at: int) -> None:
+        """Record that a user was seen, to be written on the next flush."""
+        self.pending[user_id] = seen_at
+        if self.task is None or self.task.done():
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def run(self) -> None:
+        """Flush pending times every interval."""
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def take(self) -> list[list[int]]:
+        """Remove and return pending times as UPDATE_LAST_SEEN parameters."""
+        pending, self.pending = self.pending, {}
+        return [[seen_at, user_id] for user_id, seen_at in pending.items()]
+
+    def restore(self, parameters: list[list[int]]) -> None:
+        """Put back times from a failed flush, unless newer ones were recorded."""
+        for seen_at, user_id in parameters:
+            self.pending.setdefault(user_id, seen_at)
+
+    async def flush(self) -> None:
+        """Write pending times in a single transaction."""
+        if not (parameters := self.take()):
+            return
+        try:
+            await write(lambda con: con.executemany(UPDATE_LAST_SEEN, parameters))
+        except BaseException:
+            self.restore(parameters)
+            raise
+
+    def flush_sync(self) -> None:
+        """Write pending times without an event loop, used at shutdown."""
+        if not (parameters := self.take()):
+            return
+        writer.submit(
+            lambda con: con.executemany(UPDATE_LAST_SEEN, parameters)
+        ).result()
+
+
+last_seen = LastSeen(FLUSH_INTERVAL)
+atexit.register(last_seen.flush_sync)
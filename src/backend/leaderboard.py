@@ -0,0 +1,134 @@
+"""In-memory leaderboards of the most followed users and startups."""
+
+from __future__ import annotations
+
+import asyncio
+from bisect import insort
+from time import monotonic
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from . import env
+from .db import db
+from .models import StartupHandle, UserHandle
+from .statements import TOP_STARTUPS, TOP_USERS
+
+if TYPE_CHECKING:
+    from .statements import Statement
+
+H = TypeVar("H", UserHandle, StartupHandle)
+
+# Number of entries served, pages past this are empty.
+LEADERBOARD_SIZE = int(env.variables.get("LEADERBOARD_SIZE", "100"))
+LEADERBOARD_PAGE_SIZE = int(env.variables.get("LEADERBOARD_PAGE_SIZE", "5"))
+# Seconds before reloading from the database, to pick up other workers' changes.
+LEADERBOARD_TTL = float(env.variables.get("LEADERBOARD_TTL", "300"))
+
+
+class Leaderboard(Generic[H]):
+    """Handles ordered by follower count, updated as follower counts change.
+
+    Twice `size` entries are kept so that unfollows rarely push an entry out of the
+    served range. Every handle not on the board has at most `floor` followers, so
+    the order of the board is the order of the whole table.
+    """
+
+    def __init__(self, struct: type[H], sql: Statement, size: int, ttl: float) -> None:
+        """Initialize an empty board, it is loaded on the first read."""
+        self.struct = struct
+        self.sql = sql
+        self.size = size
+        self.capacity = 2 * size
+        self.ttl = ttl
+        self.handles: dict[int, H] = {}
+        self.order: list[tuple[int, int]] = []
+        self.floor = 0
+        self.complete = False
+        self.expires_at = float("-inf")
+        self.lock = asyncio.Lock()
+        self.pending: list[H | int] | None = None
+
+    @staticmethod
+    def key(handle: H) -> tuple[int, int]:
+        """Sort key matching `ORDER BY FollowerCount DESC, ID DESC`."""
+        return (-handle.follower_count, -handle.id)
+
+    def is_stale(self) -> bool:
+        """Check if the board expired or lost entries that are needed to serve it."""
+        return self.expires_at < monotonic() or (
+            len(self.order) < self.size and not self.complete
+        )
+
+    async def page(self, offset: int, limit: int) -> list[H]:
+        """Return up to `limit` handles starting at `offset`."""
+        if self.is_stale():
+            await self.load()
+        end = min(offset + limit, self.size)
+        return [self.handles[-id_] for _, id_ in self.order[max(offset, 0) : end]]
+
+    async def load(self) -> None:
+        """Replace the board with the top entries from the database."""
+        async with self.lock:
+            if not self.is_stale():
+                return
+            self.pending = []
+            try:
+                async with db() as (_, cur):
+                    handles = await cur.fetchall_into(
+                        self.struct, self.sql, [self.capacity]
+                    )
+                self.handles = {handle.id: handle for handle in handles}
+                self.order = sorted(map(self.key, handles))
+                self.complete = len(handles) < self.capacity
+                self.floor = 0 if self.complete else handles[-1].follower_count
+                self.expires_at = monotonic() + self.ttl
+                # Changes committed while loading may be missing from the result.
+                for change in self.pending:
+                    if isinstance(change, int):
+                        self.discard(change)
+                    else:
+                        self.apply(change)
+            finally:
+                self.pending = None
+
+    def update(self, *handles: H) -> None:
+        """Apply changed handles, call after the change is committed."""
+        for handle in handles:
+            if self.pending is not None:
+                self.pending.append(handle)
+            self.apply(handle)
+
+    def apply(self, handle: H) -> None:
+        """Insert, move or drop a handle according to its follower count."""
+        listed = self.handles.pop(handle.id, None)
+        if listed is not None:
+            self.order.remove(self.key(listed))
+        count = handle.follower_count
+        if count > self.floor or (
+            count == self.floor
+            and (listed is not None or len(self.order) < self.capacity)
+        ):
+            self.handles[handle.id] = handle
+            insort(self.order, self.key(handle))
+            if len(self.order) > self.capacity:
+                _, id_ = self.order.pop()
+                self.floor = self.handles.pop(-id_).follower_count
+                self.complete = False
+        elif listed is not None:
+            self.complete = False
+
+    def remove(self, id_: int) -> None:
+        """Remove a deleted entry, call after the deletion is committed."""
+        if self.pending is not None:
+            self.pending.append(id_)
+        self.discard(id_)
+
+    def discard(self, id_: int) -> None:
+        """Remove an entry if it is on the board."""
+        if (listed := self.handles.pop(id_, None)) is not None:
+            self.order.remove(self.key(listed))
+
+
+user_leaderboard = Leaderboard(UserHandle, TOP_USERS, LEADERBOARD_SIZE, LEADERBOARD_TTL)
+startup_leaderboard = Leaderboard(
+    StartupHandle, TOP_STARTUPS, LEADERBOARD_SIZE, LEADERBOARD_TTL
+)
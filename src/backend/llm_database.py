@@ -1,19 +1,54 @@
 # ruff: noqa
 from __future__ import annotations
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from time import perf_counter
+from typing import Any
 import msgspec.json
 
 import requests
+from rich.console import Console
+from rich.table import Table
 
+from . import env
 from .misc import seconds_since_1970
 
-HOST = "http://127.0.0.1:8000"
+HOST = env.variables.get("LOAD_HOST", "http://127.0.0.1:8000")
 SESSION_COOKIE_NAME = "sessionid"
+# Concurrent clients used for seeding and virtual users used by `load`.
+LOAD_USERS = int(env.variables.get("LOAD_USERS", "16"))
+LOAD_DURATION = float(env.variables.get("LOAD_DURATION", "30"))
+# Fraction of `load` requests that go to write endpoints.
+LOAD_WRITE_RATIO = float(env.variables.get("LOAD_WRITE_RATIO", "0.1"))
 
 
-def get_user_id(username: str) -> int:
-    return requests.post(
+def read_data() -> Any:
+    return msgspec.json.decode(Path("llm_database.json").read_text())
+
+
+def login(user: Any) -> requests.Session:
+    """Log in once, the session keeps the cookie and the connection."""
+    session = requests.Session()
+    session.post(
+        f"{HOST}/login",
+        json={
+            "username": user["username"],
+            "password": user["password"],
+        },
+    )
+    return session
+
+
+def login_all(users: list[Any]) -> dict[str, requests.Session]:
+    with ThreadPoolExecutor(LOAD_USERS) as executor:
+        sessions = executor.map(login, users)
+        return {user["username"]: session for user, session in zip(users, sessions)}
+
+
+def get_user_id(session: requests.Session, username: str) -> int:
+    return session.post(
         f"{HOST}/find_user",
         json={
             "username": username,
@@ -22,80 +57,230 @@ def get_user_id(username: str) -> int:
 
 
 def main() -> None:
-    data = msgspec.json.decode(Path("llm_database.json").read_text())
-    for user in data["users"]:
-        requests.post(
-            f"{HOST}/register",
-            json={
-                "avatar": "",
-                **user,
-            },
+    data = read_data()
+    users = data["users"]
+    with ThreadPoolExecutor(LOAD_USERS) as executor:
+        list(
+            executor.map(
+                lambda user: requests.post(
+                    f"{HOST}/register",
+                    json={
+                        "avatar": "",
+                        **user,
+                    },
+                ),
+                users,
+            )
         )
-    for follower in data["users"]:
+    sessions = login_all(users)
+    anonymous = requests.Session()
+    user_ids = {
+        user["username"]: get_user_id(anonymous, user["username"]) for user in users
+    }
+
+    def follow(follower: Any) -> None:
+        session = sessions[follower["username"]]
         for _ in range(10):
-            following = random.choice(data["users"])
+            following = random.choice(users)
             if follower["username"] == following["username"]:
                 continue
-            random.choice(data["users"])
-            session = requests.post(
-                f"{HOST}/login",
-                json={
-                    "username": follower["username"],
-                    "password": follower["password"],
-                },
-            ).cookies.get(SESSION_COOKIE_NAME)
-            following_id = get_user_id(following["username"])
-            requests.post(
+            session.post(
                 f"{HOST}/follow_user",
-                json={"user_id": following_id},
-                cookies={SESSION_COOKIE_NAME: session},
+                json={"user_id": user_ids[following["username"]]},
             )
-    for blog in data["blogs"]:
-        user = random.choice(data["users"])
-        session = requests.post(
-            f"{HOST}/login",
-            json={
-                "username": user["username"],
-                "password": user["password"],
-            },
-        ).cookies.get(SESSION_COOKIE_NAME)
-        requests.post(
+
+    def post_blog(session: requests.Session, blog: Any) -> None:
+        session.post(
             f"{HOST}/post_blog",
             json={
                 "poll_options": None,
                 **blog,
             },
-            cookies={SESSION_COOKIE_NAME: session},
         )
-    for startup in data["startups"]:
-        user = random.choice(data["users"])
-        session = requests.post(
-            f"{HOST}/login",
-            json={
-                "username": user["username"],
-                "password": user["password"],
-            },
-        ).cookies.get(SESSION_COOKIE_NAME)
+
+    def create_startup(session: requests.Session, startup: Any) -> None:
         founded_at = random.randint(955324320, seconds_since_1970())
-        startup_id = requests.post(
+        startup_id = session.post(
             f"{HOST}/create_startup",
             json={
                 "banner": "",
                 "founded_at": founded_at,
                 **startup,
             },
-            cookies={SESSION_COOKIE_NAME: session},
         ).json()
         for _ in range(10):
-            founder = random.choice(data["users"])
-            founder_id = get_user_id(founder["username"])
-            requests.post(
+            founder = random.choice(users)
+            session.post(
                 f"{HOST}/add_founder",
                 json={
                     "startup_id": startup_id,
-                    "founder_id": founder_id,
+                    "founder_id": user_ids[founder["username"]],
                     "keynote": random.choice(data["keynotes"]),
                     "founded_at": random.randint(founded_at, seconds_since_1970()),
                 },
-                cookies={SESSION_COOKIE_NAME: session},
             )
+
+    # Sessions are not shared between threads, so each user's posts and startups
+    # are created by one task.
+    posts: dict[str, list[Any]] = {}
+    for blog in data["blogs"]:
+        posts.setdefault(random.choice(users)["username"], []).append(blog)
+    startups: dict[str, list[Any]] = {}
+    for startup in data["startups"]:
+        startups.setdefault(random.choice(users)["username"], []).append(startup)
+
+    def create(user: Any) -> None:
+        session = sessions[user["username"]]
+        for blog in posts.get(user["username"], []):
+            post_blog(session, blog)
+        for startup in startups.get(user["username"], []):
+            create_startup(session, startup)
+
+    with ThreadPoolExecutor(LOAD_USERS) as executor:
+        list(executor.map(follow, users))
+        list(executor.map(create, users))
+
+
+class VirtualUser:
+    """Logged-in client that sends a random mix of reads and writes."""
+
+    def __init__(
+        self, data: Any, session: requests.Session, user_ids: list[int]
+    ) -> None:
+        self.data = data
+        self.session = session
+        self.user_ids = user_ids
+        self.samples: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    def call(self, endpoint: str, parameters: dict[str, Any]) -> Any:
+        start = perf_counter()
+        try:
+            response = self.session.post(f"{HOST}/{endpoint}", json=parameters)
+            ok = response.ok
+        except requests.RequestException:
+            response = None
+            ok = False
+        self.samples.setdefault(endpoint, []).append(perf_counter() - start)
+        if not ok:
+            self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+            return None
+        return response.json() if response is not None and response.content else None
+
+    def read(self) -> None:
+        user = random.choice(self.data["users"])
+        blog = random.choice(self.data["blogs"])
+        endpoint, parameters = random.choice(
+            [
+                ("get_user", {"username": user["username"]}),
+                ("get_blog_page", {"cursor": None, "limit": 20}),
+                ("get_timeline", {"cursor": None}),
+                ("top_users", {"page": 0}),
+                ("top_startups", {"page": 0}),
+                (
+                    "search_blogs",
+                    {
+                        "query": random.choice(blog["title"].split() or ["a"]),
+                        "cursor": None,
+                    },
+                ),
+                ("search_users", {"prefix": user["username"][:2]}),
+                ("find_user", {"username": user["username"]}),
+            ]
+        )
+        self.call(endpoint, parameters)
+
+    def write(self) -> None:
+        user_id = random.choice(self.user_ids)
+        blog = random.choice(self.data["blogs"])
+        endpoint, parameters = random.choice(
+            [
+                ("follow_user", {"user_id": user_id}),
+                ("unfollow_user", {"user_id": user_id}),
+                ("post_blog", {"poll_options": None, **blog}),
+                ("follow_startup", None),
+            ]
+        )
+        if parameters is None:
+            startups = self.call("top_startups", {"page": 0}) or []
+            if not startups:
+                return
+            parameters = {"startup_id": random.choice(startups)["id"]}
+        self.call(endpoint, parameters)
+
+    def run(self, deadline: float) -> None:
+        while perf_counter() < deadline:
+            if random.random() < LOAD_WRITE_RATIO:
+                self.write()
+            else:
+                self.read()
+
+
+def percentile(samples: list[float], fraction: float) -> float:
+    """Return the nearest-rank percentile of sorted samples."""
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def load() -> None:
+    """Drive a running server with concurrent virtual users and report latencies."""
+    data = read_data()
+    users = data["users"]
+    anonymous = requests.Session()
+    user_ids = [get_user_id(anonymous, user["username"]) for user in users]
+    # Every virtual user gets its own session, even when they log in as the same user.
+    with ThreadPoolExecutor(LOAD_USERS) as executor:
+        sessions = list(
+            executor.map(login, (users[i % len(users)] for i in range(LOAD_USERS)))
+        )
+    virtual_users = [VirtualUser(data, session, user_ids) for session in sessions]
+    start = perf_counter()
+    threads = [
+        threading.Thread(target=user.run, args=(start + LOAD_DURATION,))
+        for user in virtual_users
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = perf_counter() - start
+    samples: dict[str, list[float]] = {}
+    errors: dict[str, int] = {}
+    for user in virtual_users:
+        for endpoint, latencies in user.samples.items():
+            samples.setdefault(endpoint, []).extend(latencies)
+        for endpoint, count in user.errors.items():
+            errors[endpoint] = errors.get(endpoint, 0) + count
+    table = Table(
+        title=f"{LOAD_USERS} virtual users, {elapsed:.1f}s, write ratio {LOAD_WRITE_RATIO}"
+    )
+    for column in (
+        "endpoint",
+        "requests",
+        "errors",
+        "req/s",
+        "p50 ms",
+        "p95 ms",
+        "p99 ms",
+    ):
+        table.add_column(column, justify="left" if column == "endpoint" else "right")
+    for endpoint, latencies in sorted(samples.items()):
+        latencies.sort()
+        table.add_row(
+            endpoint,
+            str(len(latencies)),
+            str(errors.get(endpoint, 0)),
+            f"{len(latencies) / elapsed:.1f}",
+            *(f"{percentile(latencies, p) * 1000:.1f}" for p in (0.50, 0.95, 0.99)),
+        )
+    total = sum(map(len, samples.values()))
+    table.add_section()
+    table.add_row(
+        "total",
+        str(total),
+        str(sum(errors.values())),
+        f"{total / elapsed:.1f}",
+        "",
+        "",
+        "",
+    )
+    Console().print(table)
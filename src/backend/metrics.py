@@ -0,0 +1,255 @@
+"""Request and database metrics, served in the Prometheus text format at /metrics.
+
+Metrics are per process, so with several workers each scrape sees one of them.
+"""
+
+from __future__ import annotations
+
+import threading
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from collections.abc import Awaitable, Callable, Sequence
+
+    Scope = dict[str, Any]
+    Message = dict[str, Any]
+    Receive = Callable[[], Awaitable[Message]]
+    Send = Callable[[Message], Awaitable[None]]
+    ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+METRICS_PATH = "/metrics"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100, 250, 1000)
+
+
+def escape(value: str) -> str:
+    """Escape a label value."""
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Return `{name="value",...}`, or an empty string without labels."""
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{escape(v)}"' for n, v in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+class Counter:
+    """Monotonically increasing count per label set."""
+
+    def __init__(self, name: str, documentation: str, labels: Sequence[str]) -> None:
+        """Initialize the counter."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values: dict[tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Add `amount` to the count of a label set."""
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        """Return the lines of the text format."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} counter",
+        ]
+        with self.lock:
+            for labels, value in sorted(self.values.items()):
+                lines.append(
+                    f"{self.name}{format_labels(self.labels, labels)} {value:g}"
+                )
+        return lines
+
+
+class Histogram:
+    """Bucketed observations per label set."""
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labels: Sequence[str],
+        buckets: Sequence[float],
+    ) -> None:
+        """Initialize the histogram."""
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # Per label set: a count per bucket plus one for +Inf, and the sum.
+        self.values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation."""
+        with self.lock:
+            if (entry := self.values.get(labels)) is None:
+                entry = self.values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1][0] += value
+
+    def render(self) -> list[str]:
+        """Return the lines of the text format, buckets are cumulative."""
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} histogram",
+        ]
+        names = (*self.labels, "le")
+        with self.lock:
+            for labels, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip((*self.buckets, float("inf")), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    lines.append(
+                        f"{self.name}_bucket{format_labels(names, (*labels, le))} "
+                        f"{cumulative}"
+                    )
+                suffix = format_labels(self.labels, labels)
+                lines.append(f"{self.name}_sum{suffix} {total[0]:g}")
+                lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+requests_total = Counter(
+    "backend_requests_total", "Requests handled, by endpoint.", ["endpoint"]
+)
+request_errors_total = Counter(
+    "backend_request_errors_total",
+    "Requests that raised or answered with a 5xx status, by endpoint.",
+    ["endpoint"],
+)
+request_seconds = Histogram(
+    "backend_request_seconds",
+    "Time to answer a request, by endpoint.",
+    ["endpoint"],
+    LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "backend_request_queries",
+    "SQL statements executed per request, by endpoint.",
+    ["endpoint"],
+    COUNT_BUCKETS,
+)
+request_rows = Histogram(
+    "backend_request_rows",
+    "Rows returned by SQL queries per request, by endpoint.",
+    ["endpoint"],
+    COUNT_BUCKETS,
+)
+request_sqlite_seconds = Histogram(
+    "backend_request_sqlite_seconds",
+    "Time spent running SQL per request, by endpoint.",
+    ["endpoint"],
+    LATENCY_BUCKETS,
+)
+request_commit_seconds = Histogram(
+    "backend_request_commit_seconds",
+    "Time spent waiting for writes to be committed per request, by endpoint.",
+    ["endpoint"],
+    LATENCY_BUCKETS,
+)
+registry: list[Counter | Histogram] = [
+    requests_total,
+    request_errors_total,
+    request_seconds,
+    request_queries,
+    request_rows,
+    request_sqlite_seconds,
+    request_commit_seconds,
+]
+
+
+class RequestStats:
+    """Database work done on behalf of one request."""
+
+    __slots__ = ("commit_seconds", "endpoint", "queries", "rows", "sqlite_seconds")
+
+    def __init__(self, endpoint: str) -> None:
+        """Initialize empty stats."""
+        self.endpoint = endpoint
+        self.queries = 0
+        self.rows = 0
+        self.sqlite_seconds = 0.0
+        self.commit_seconds = 0.0
+
+
+# Set for the duration of a request, the database layer adds to it. Functions sent
+# to other threads must capture it first, executors do not copy the context.
+request_stats: ContextVar[RequestStats | None] = ContextVar(
+    "request_stats", default=None
+)
+
+
+def render() -> bytes:
+    """Return every metric in the Prometheus text format."""
+    lines: list[str] = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return ("\n".join(lines) + "\n").encode()
+
+
+class Metrics:
+    """ASGI middleware timing every request and serving `METRICS_PATH`."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        """Wrap an ASGI app."""
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle a request."""
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] == METRICS_PATH:
+            await self.metrics(send)
+            return
+        status = 500
+        stats = RequestStats(scope["path"].lstrip("/"))
+        token = request_stats.set(stats)
+
+        async def send_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            elapsed = perf_counter() - start
+            request_stats.reset(token)
+            # Unknown paths are not labelled by name, to bound the label values.
+            endpoint = "unknown" if status == 404 else stats.endpoint  # noqa: PLR2004
+            requests_total.inc(endpoint)
+            if status >= 500:  # noqa: PLR2004
+                request_errors_total.inc(endpoint)
+            request_seconds.observe(elapsed, endpoint)
+            request_queries.observe(stats.queries, endpoint)
+            request_rows.observe(stats.rows, endpoint)
+            request_sqlite_seconds.observe(stats.sqlite_seconds, endpoint)
+            request_commit_seconds.observe(stats.commit_seconds, endpoint)
+
+    @staticmethod
+    async def metrics(send: Send) -> None:
+        """Answer with the current metrics."""
+        body = render()
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+            }
+        )
+        await send({"type": "http.response.body", "body": body})
@@ -1,5 +1,3 @@
-begin transaction;
-
 create table if not exists User (
     ID integer primary key not null,
     Username text not null unique,
@@ -82,5 +80,3 @@ create table if not exists Founder (
     foreign key (Founder) references User(ID) on delete cascade,
     unique (Startup, Founder)
 ) strict;
-
-end transaction;
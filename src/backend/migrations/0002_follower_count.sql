@@ -0,0 +1,31 @@
+-- Follower counts kept up to date by triggers, so profiles and rankings do not
+-- count follower rows. Existing follows are counted once here.
+alter table User add column FollowerCount integer not null default 0;
+alter table Startup add column FollowerCount integer not null default 0;
+
+create trigger if not exists UserFollowerInsert after insert on UserFollower
+begin
+    update User set FollowerCount = FollowerCount + 1 where ID = new.Following;
+end;
+
+create trigger if not exists UserFollowerDelete after delete on UserFollower
+begin
+    update User set FollowerCount = FollowerCount - 1 where ID = old.Following;
+end;
+
+create trigger if not exists StartupFollowerInsert after insert on StartupFollower
+begin
+    update Startup set FollowerCount = FollowerCount + 1 where ID = new.Following;
+end;
+
+create trigger if not exists StartupFollowerDelete after delete on StartupFollower
+begin
+    update Startup set FollowerCount = FollowerCount - 1 where ID = old.Following;
+end;
+
+update User set FollowerCount = (
+    select count(ID) from UserFollower where Following = User.ID
+);
+update Startup set FollowerCount = (
+    select count(ID) from StartupFollower where Following = Startup.ID
+);
@@ -0,0 +1,12 @@
+create index if not exists UserFollowerFollowing on UserFollower (Following, Follower);
+
+create index if not exists StartupFollowerFollowing
+on StartupFollower (Following, Follower);
+
+create index if not exists BlogCreatedAt on Blog (CreatedAt, ID);
+
+create index if not exists BlogAuthorCreatedAt on Blog (Author, CreatedAt);
+
+create index if not exists PollVoteOption on PollVote (Option);
+
+create index if not exists FounderFounder on Founder (Founder, FoundedAt);
@@ -0,0 +1 @@
+create index if not exists UserFollowerCount on User (FollowerCount);
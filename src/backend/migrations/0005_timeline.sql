@@ -0,0 +1,17 @@
+create table if not exists Timeline (
+    Owner integer not null,
+    Blog integer not null,
+    CreatedAt integer not null,
+    foreign key (Owner) references User(ID) on delete cascade,
+    foreign key (Blog) references Blog(ID) on delete cascade,
+    primary key (Owner, CreatedAt, Blog)
+) strict, without rowid;
+
+create index if not exists TimelineBlog on Timeline (Blog);
+
+insert or ignore into Timeline (Owner, Blog, CreatedAt)
+select Author, ID, CreatedAt from Blog
+union all
+select UserFollower.Follower, Blog.ID, Blog.CreatedAt
+from UserFollower
+inner join Blog on Blog.Author = UserFollower.Following;
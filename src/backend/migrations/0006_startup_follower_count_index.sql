@@ -0,0 +1 @@
+create index if not exists StartupFollowerCount on Startup (FollowerCount);
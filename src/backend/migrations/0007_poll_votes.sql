@@ -0,0 +1,43 @@
+create table PollVoteNew (
+    ID integer primary key not null,
+    Blog integer not null,
+    Voter integer not null,
+    Option integer not null,
+    foreign key (Blog) references Blog(ID) on delete cascade,
+    foreign key (Voter) references User(ID) on delete cascade,
+    foreign key (Option) references PollOption(ID) on delete cascade,
+    unique (Blog, Voter)
+) strict;
+
+-- Keep the latest vote of anyone who voted twice before (Blog, Voter) was unique.
+insert into PollVoteNew (ID, Blog, Voter, Option)
+select max(ID), Blog, Voter, Option from PollVote group by Blog, Voter;
+
+drop table PollVote;
+
+alter table PollVoteNew rename to PollVote;
+
+create index if not exists PollVoteOption on PollVote (Option);
+
+alter table PollOption add column Votes integer not null default 0;
+
+update PollOption set Votes = (
+    select count(ID) from PollVote where Option = PollOption.ID
+);
+
+create trigger if not exists PollVoteInsert after insert on PollVote
+begin
+    update PollOption set Votes = Votes + 1 where ID = new.Option;
+end;
+
+create trigger if not exists PollVoteDelete after delete on PollVote
+begin
+    update PollOption set Votes = Votes - 1 where ID = old.Option;
+end;
+
+create trigger if not exists PollVoteUpdate after update of Option on PollVote
+when old.Option <> new.Option
+begin
+    update PollOption set Votes = Votes - 1 where ID = old.Option;
+    update PollOption set Votes = Votes + 1 where ID = new.Option;
+end;
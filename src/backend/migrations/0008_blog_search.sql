@@ -0,0 +1,32 @@
+create virtual table if not exists BlogSearch using fts5 (
+    Title,
+    Content,
+    content = 'Blog',
+    content_rowid = 'ID',
+    tokenize = 'porter unicode61 remove_diacritics 2'
+);
+
+-- Title matches count ten times as much as content matches.
+insert into BlogSearch (BlogSearch, rank) values ('rank', 'bm25(10.0, 1.0)');
+
+insert into BlogSearch (BlogSearch) values ('rebuild');
+
+create trigger if not exists BlogSearchInsert after insert on Blog
+begin
+    insert into BlogSearch (rowid, Title, Content)
+    values (new.ID, new.Title, new.Content);
+end;
+
+create trigger if not exists BlogSearchDelete after delete on Blog
+begin
+    insert into BlogSearch (BlogSearch, rowid, Title, Content)
+    values ('delete', old.ID, old.Title, old.Content);
+end;
+
+create trigger if not exists BlogSearchUpdate after update of Title, Content on Blog
+begin
+    insert into BlogSearch (BlogSearch, rowid, Title, Content)
+    values ('delete', old.ID, old.Title, old.Content);
+    insert into BlogSearch (rowid, Title, Content)
+    values (new.ID, new.Title, new.Content);
+end;
@@ -0,0 +1,5 @@
+create index if not exists UserUsernameNocase on User (Username collate nocase);
+
+create index if not exists UserNameNocase on User (Name collate nocase);
+
+create index if not exists StartupNameNocase on Startup (Name collate nocase);
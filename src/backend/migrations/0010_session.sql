@@ -0,0 +1,11 @@
+create table if not exists Session (
+    ID text primary key not null,
+    User integer not null,
+    CreatedAt integer not null,
+    ExpiresAt integer not null,
+    foreign key (User) references User(ID) on delete cascade
+) strict, without rowid;
+
+create index if not exists SessionUser on Session (User);
+
+create index if not exists SessionExpiresAt on Session (ExpiresAt);
@@ -0,0 +1,39 @@
+-- Follows and unfollows in commit order, read by every worker to keep its in-memory
+-- follow graph in sync. Only the most recent changes are kept.
+-- AUTOINCREMENT so that IDs keep increasing even if every row is pruned.
+create table if not exists FollowChange (
+    ID integer primary key autoincrement not null,
+    Startup integer not null,
+    Follower integer not null,
+    Following integer not null,
+    Followed integer not null
+) strict;
+
+create trigger if not exists FollowChangePrune after insert on FollowChange
+begin
+    delete from FollowChange where ID <= new.ID - 100000;
+end;
+
+create trigger if not exists UserFollowerChangeInsert after insert on UserFollower
+begin
+    insert into FollowChange (Startup, Follower, Following, Followed)
+    values (false, new.Follower, new.Following, true);
+end;
+
+create trigger if not exists UserFollowerChangeDelete after delete on UserFollower
+begin
+    insert into FollowChange (Startup, Follower, Following, Followed)
+    values (false, old.Follower, old.Following, false);
+end;
+
+create trigger if not exists StartupFollowerChangeInsert after insert on StartupFollower
+begin
+    insert into FollowChange (Startup, Follower, Following, Followed)
+    values (true, new.Follower, new.Following, true);
+end;
+
+create trigger if not exists StartupFollowerChangeDelete after delete on StartupFollower
+begin
+    insert into FollowChange (Startup, Follower, Following, Followed)
+    values (true, old.Follower, old.Following, false);
+end;
@@ -0,0 +1,12 @@
+-- Users to follow, precomputed by `rye run suggest` and read by `suggested_users`.
+create table if not exists Suggestion (
+    User integer not null,
+    Rank integer not null,
+    Suggested integer not null,
+    Score real not null,
+    foreign key (User) references User(ID) on delete cascade,
+    foreign key (Suggested) references User(ID) on delete cascade,
+    primary key (User, Rank)
+) strict, without rowid;
+
+create index if not exists SuggestionSuggested on Suggestion (Suggested);
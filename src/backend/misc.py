@@ -2,9 +2,47 @@
 
 from __future__ import annotations
 
+import base64
+import binascii
 from time import time
 
+# Results returned by prefix searches, and names read from each index range.
+PREFIX_SEARCH_LIMIT = 8
+PREFIX_SEARCH_CANDIDATES = 50
+MAX_PREFIX_LENGTH = 64
+# Range of SQLite's INTEGER, larger Python ints cannot be bound to a statement.
+MIN_INTEGER = -(2**63)
+MAX_INTEGER = 2**63 - 1
+
 
 def seconds_since_1970() -> int:
     """Return seconds since epoch."""
     return int(time())
+
+
+def encode_cursor(*keys: int) -> str:
+    """Encode a keyset pagination position as an opaque string."""
+    return base64.urlsafe_b64encode(":".join(map(str, keys)).encode()).decode()
+
+
+def decode_cursor(cursor: str, length: int) -> tuple[int, ...] | None:
+    """Decode a cursor made by `encode_cursor`, returns None if it is malformed.
+
+    Keys outside of SQLite's INTEGER range are malformed too, they could not be bound.
+    """
+    try:
+        keys = tuple(
+            int(key) for key in base64.urlsafe_b64decode(cursor).decode().split(":")
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if len(keys) != length:
+        return None
+    if not all(MIN_INTEGER <= key <= MAX_INTEGER for key in keys):
+        return None
+    return keys
+
+
+def prefix_range(prefix: str) -> tuple[str, str]:
+    """Return bounds such that `low <= name < high` for names starting with prefix."""
+    return prefix, prefix + "\U0010ffff"
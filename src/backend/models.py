@@ -135,6 +135,30 @@ class Blog(Struct):
     created_at: int
 
 
+class BlogPage(Struct):
+    """Page of blog posts."""
+
+    blogs: list[Blog]
+    next_cursor: str | None
+
+
+class BlogMatch(Blog):
+    """Blog post found by a search.
+
+    Matched terms in `snippet` are wrapped in U+0002 and U+0003, so that the
+    client can highlight them without rendering the post as HTML.
+    """
+
+    snippet: str
+
+
+class BlogSearchPage(Struct):
+    """Page of blog posts found by a search, most relevant first."""
+
+    blogs: list[BlogMatch]
+    next_cursor: str | None
+
+
 class UserHandle(Struct):
     """User handle."""
 
@@ -145,6 +169,15 @@ class UserHandle(Struct):
     follower_count: int
 
 
+class StartupHandle(Struct):
+    """Startup handle."""
+
+    id: int
+    name: str
+    banner: str
+    follower_count: int
+
+
 class Startup(Struct):
     """Startup."""
 
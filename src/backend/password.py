@@ -2,14 +2,74 @@
 
 from __future__ import annotations
 
+import asyncio
+import atexit
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, TypeVar
+
 import argon2
 
+from . import env
+
+T = TypeVar("T")
+
+HASHER_THREADS = int(env.variables.get("HASHER_THREADS", str(os.cpu_count() or 1)))
+HASHER_QUEUE_LIMIT = int(env.variables.get("HASHER_QUEUE_LIMIT", "64"))
+
 argon2_hasher = argon2.PasswordHasher()
 
 
-def hash_password(password: str, created_at: int) -> str:
+class HasherBusyError(RuntimeError):
+    """Raised when too many hashing jobs are already queued."""
+
+
+class HasherPool:
+    """Thread pool for argon2, which releases the GIL while hashing.
+
+    Jobs beyond `limit` queued or running at once are rejected immediately instead
+    of waiting behind a burst of logins.
+    """
+
+    def __init__(self, threads: int, limit: int) -> None:
+        """Initialize the pool."""
+        self.executor = ThreadPoolExecutor(threads, thread_name_prefix="argon2")
+        self.limit = limit
+        self.pending = 0
+
+    async def run(self, function: Callable[..., T], *args: Any) -> T:  # noqa: ANN401
+        """Run a hashing function on the pool.
+
+        Raises
+        ------
+            HasherBusyError: If the queue is full.
+
+        """
+        if self.pending >= self.limit:
+            msg = "Too many password hashing requests, try again later."
+            raise HasherBusyError(msg)
+        self.pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, function, *args)
+        finally:
+            self.pending -= 1
+
+
+hasher_pool = HasherPool(HASHER_THREADS, HASHER_QUEUE_LIMIT)
+atexit.register(hasher_pool.executor.shutdown)
+
+
+def _verify(stored_hash: str, password: str) -> bool:
+    try:
+        return argon2_hasher.verify(stored_hash, password)
+    except argon2.exceptions.Argon2Error:
+        return False
+
+
+async def hash_password(password: str, created_at: int) -> str:
     """Hash password."""
-    return argon2_hasher.hash(f"{password}{created_at}")
+    return await hasher_pool.run(argon2_hasher.hash, f"{password}{created_at}")
 
 
 def password_needs_rehash(stored_hash: str) -> bool:
@@ -17,9 +77,8 @@ def password_needs_rehash(stored_hash: str) -> bool:
     return argon2_hasher.check_needs_rehash(stored_hash)
 
 
-def is_password_matching(stored_hash: str, password: str, created_at: int) -> bool:
+async def is_password_matching(
+    stored_hash: str, password: str, created_at: int
+) -> bool:
     """Return true if password matches stored hash."""
-    try:
-        return argon2_hasher.verify(stored_hash, f"{password}{created_at}")
-    except argon2.exceptions.Argon2Error:
-        return False
+    return await hasher_pool.run(_verify, stored_hash, f"{password}{created_at}")
@@ -0,0 +1,195 @@
+"""Sessions persisted in the database, shared by every worker process."""
+
+from __future__ import annotations
+
+import atexit
+import contextlib
+import hashlib
+import secrets
+from contextvars import ContextVar
+from http.cookies import CookieError, SimpleCookie
+from typing import TYPE_CHECKING
+
+from reproca.sessions import Sessions
+
+from . import DATABASE, env
+from .cache import LRUCache
+from .db import POOL_SIZE, POOL_TIMEOUT, Pool, run, write, writer
+from .misc import seconds_since_1970
+from .models import Session
+from .statements import (
+    DELETE_EXPIRED_SESSIONS,
+    DELETE_SESSION,
+    GET_SESSION,
+    INSERT_SESSION,
+)
+
+if TYPE_CHECKING:
+    import sqlite3
+    from collections.abc import Callable
+
+    from .metrics import ASGIApp, Receive, Scope, Send
+
+SESSION_MAX_AGE = int(env.variables.get("SESSION_MAX_AGE", str(30 * 24 * 60 * 60)))
+SESSION_CACHE_SIZE = int(env.variables.get("SESSION_CACHE_SIZE", "4096"))
+# Seconds a cached session is trusted before checking that it was not logged out
+# by another worker.
+SESSION_REVALIDATE = float(env.variables.get("SESSION_REVALIDATE", "30"))
+# Name of reproca's session cookie.
+SESSION_COOKIE = "sessionid"
+
+
+def session_key(sessionid: str) -> str:
+    """Return the key stored for a session ID, so a database leak has no cookies."""
+    return hashlib.sha256(sessionid.encode()).hexdigest()
+
+
+class SessionStore(Sessions[int, Session]):
+    """Session table with an in-process LRU cache in front of it.
+
+    reproca's session interface is synchronous and called on the event loop, so
+    `SessionLoader` reads the session on the executor before the request reaches
+    reproca, and `get` answers from that. Endpoints create and delete sessions with
+    `insert` and `delete`, which wait for the commit without blocking the loop.
+    Cached sessions expire with the session, or sooner to revalidate.
+    """
+
+    def __init__(self, max_age: int, cache_size: int, revalidate: float) -> None:
+        """Initialize the store."""
+        super().__init__()
+        self.max_age = max_age
+        self.cache: LRUCache[str, Session] = LRUCache(cache_size, revalidate)
+        # Not `db.pool`, whose slots are only for `db()` under its limiter.
+        self.pool = Pool(DATABASE, POOL_SIZE, POOL_TIMEOUT)
+
+    def inserter(
+        self, user_id: int
+    ) -> tuple[str, Callable[[sqlite3.Connection], None]]:
+        """Return a new session ID and the write storing it."""
+        sessionid = secrets.token_urlsafe(32)
+        key = session_key(sessionid)
+        now = seconds_since_1970()
+
+        def insert(con: sqlite3.Connection) -> None:
+            con.execute(DELETE_EXPIRED_SESSIONS, [now])
+            con.execute(INSERT_SESSION, [key, user_id, now, now + self.max_age])
+
+        return sessionid, insert
+
+    async def insert(self, user_id: int, session: Session) -> str:
+        """Store a new session and return its ID once committed."""
+        sessionid, insert = self.inserter(user_id)
+        generation = self.cache.generation
+        await write(insert)
+        self.cache.set(session_key(sessionid), session, generation, self.max_age)
+        return sessionid
+
+    async def delete(self, sessionid: str) -> None:
+        """Delete a session on every worker once committed."""
+        key = session_key(sessionid)
+        await write(lambda con: con.execute(DELETE_SESSION, [key]))
+        self.cache.invalidate(key)
+
+    async def load(self, sessionid: str) -> Session | None:
+        """Return a session like `get`, reading it on the executor on a miss."""
+        key = session_key(sessionid)
+        if (session := self.cache.get(key)) is not None:
+            return session
+        generation = self.cache.generation
+        return self.remember(key, await run(self.read, key), generation)
+
+    def read(self, key: str) -> tuple[Session, int] | None:
+        """Read a session and the seconds until it expires, runs on any thread."""
+        now = seconds_since_1970()
+        with self.pool.connection() as con:
+            cursor = con.cursor()
+            cursor.row_factory = None
+            row = cursor.execute(GET_SESSION, [key, now]).fetchone()
+        if row is None:
+            return None
+        *fields, expires_at = row
+        return Session(*fields), expires_at - now
+
+    def remember(
+        self, key: str, read: tuple[Session, int] | None, generation: int
+    ) -> Session | None:
+        """Cache a session returned by `read` until it expires, return it."""
+        if read is None:
+            return None
+        session, expires_in = read
+        self.cache.set(key, session, generation, expires_in)
+        return session
+
+    def create(self, user_id: int, session: Session) -> str:
+        """Store a new session and return its ID, blocks until committed.
+
+        For callers off the event loop, endpoints use `insert`.
+        """
+        sessionid, insert = self.inserter(user_id)
+        generation = self.cache.generation
+        writer.submit(insert).result()
+        self.cache.set(session_key(sessionid), session, generation, self.max_age)
+        return sessionid
+
+    def get(self, sessionid: str) -> Session | None:
+        """Return the session, or None if it does not exist or expired."""
+        loaded = preloaded.get()
+        if loaded is not None and loaded[0] == sessionid:
+            return loaded[1]
+        key = session_key(sessionid)
+        if (session := self.cache.get(key)) is not None:
+            return session
+        # Only sessions that `SessionLoader` did not see are read on the loop.
+        generation = self.cache.generation
+        return self.remember(key, self.read(key), generation)
+
+    def remove_by_sessionid(self, sessionid: str) -> None:
+        """Delete a session on every worker, blocks until committed.
+
+        For callers off the event loop, endpoints use `delete`.
+        """
+        key = session_key(sessionid)
+        writer.submit(lambda con: con.execute(DELETE_SESSION, [key])).result()
+        self.cache.invalidate(key)
+
+
+# The session ID sent with the current request and its session, set by
+# `SessionLoader`.
+preloaded: ContextVar[tuple[str, Session | None] | None] = ContextVar(
+    "preloaded", default=None
+)
+
+
+class SessionLoader:
+    """ASGI middleware reading the request's session before reproca asks for it."""
+
+    def __init__(self, app: ASGIApp, store: SessionStore) -> None:
+        """Wrap an ASGI app."""
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        """Handle a request."""
+        if scope["type"] != "http" or (sessionid := cookie_sessionid(scope)) is None:
+            await self.app(scope, receive, send)
+            return
+        token = preloaded.set((sessionid, await self.store.load(sessionid)))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            preloaded.reset(token)
+
+
+def cookie_sessionid(scope: Scope) -> str | None:
+    """Return the session ID cookie of a request, if any."""
+    cookies = SimpleCookie()
+    for name, value in scope["headers"]:
+        if name == b"cookie":
+            with contextlib.suppress(CookieError):
+                cookies.load(value.decode("latin-1"))
+    morsel = cookies.get(SESSION_COOKIE)
+    return None if morsel is None else morsel.value
+
+
+session_store = SessionStore(SESSION_MAX_AGE, SESSION_CACHE_SIZE, SESSION_REVALIDATE)
+atexit.register(session_store.pool.close)
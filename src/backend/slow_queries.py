@@ -0,0 +1,125 @@
+"""Log of statements and writes slower than `SLOW_QUERY_SECONDS`.
+
+Entries are JSON lines in a rotating file. They are handed to a background thread
+so that a slow query does not also wait for the disk.
+"""
+
+from __future__ import annotations
+
+import atexit
+import logging
+import queue
+import sqlite3
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from time import time
+from typing import TYPE_CHECKING, Any
+
+import msgspec.json
+
+from . import env
+from .statements import Statement, query_plan
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+    from .metrics import RequestStats
+
+SLOW_QUERY_SECONDS = float(env.variables.get("SLOW_QUERY_SECONDS", "0.1"))
+SLOW_QUERY_LOG = env.variables.get("SLOW_QUERY_LOG", "slow_queries.log")
+SLOW_QUERY_LOG_BYTES = int(env.variables.get("SLOW_QUERY_LOG_BYTES", "10000000"))
+SLOW_QUERY_LOG_BACKUPS = int(env.variables.get("SLOW_QUERY_LOG_BACKUPS", "5"))
+
+logger = logging.getLogger("backend.slow_queries")
+logger.propagate = False
+listener: QueueListener | None = None
+# Entries are logged from executor threads and the writer thread.
+listener_lock = threading.Lock()
+# Query plans by SQL text, a statement is explained the first time it is slow.
+plans: dict[str, list[str]] = {}
+
+
+def start() -> None:
+    """Open the log file and start the thread writing to it, once."""
+    global listener  # noqa: PLW0603
+    with listener_lock:
+        if listener is not None:
+            return
+        handler = RotatingFileHandler(
+            SLOW_QUERY_LOG,
+            maxBytes=SLOW_QUERY_LOG_BYTES,
+            backupCount=SLOW_QUERY_LOG_BACKUPS,
+            encoding="utf-8",
+        )
+        records: queue.SimpleQueue[logging.LogRecord] = queue.SimpleQueue()
+        listener = QueueListener(records, handler)
+        listener.start()
+        atexit.register(listener.stop)
+        logger.addHandler(QueueHandler(records))
+        logger.setLevel(logging.WARNING)
+
+
+def shape(parameters: Sequence[Any] | None) -> list[str] | None:
+    """Return the type names of bound parameters, leaving out their values."""
+    if parameters is None:
+        return None
+    return [type(parameter).__name__ for parameter in parameters]
+
+
+def explain(con: sqlite3.Connection, sql: str) -> list[str]:
+    """Return the cached query plan of a statement, capturing it if missing."""
+    if (plan := plans.get(sql)) is None:
+        try:
+            plan = query_plan(con, sql)
+        except sqlite3.Error as error:
+            plan = [f"unavailable: {error}"]
+        plan = plans.setdefault(sql, plan)
+    return plan
+
+
+def log(  # noqa: PLR0913, PLR0917
+    con: sqlite3.Connection,
+    sql: str,
+    parameters: Sequence[Any] | None,
+    rows: int,
+    seconds: float,
+    stats: RequestStats | None,
+) -> None:
+    """Write a slow statement to the log, runs on the thread owning `con`."""
+    start()
+    entry = {
+        "time": time(),
+        "endpoint": None if stats is None else stats.endpoint,
+        "statement": sql.name if isinstance(sql, Statement) else None,
+        # msgspec does not encode str subclasses such as `Statement`.
+        "sql": str(sql),
+        "parameters": shape(parameters),
+        "rows": rows,
+        "seconds": seconds,
+        "plan": explain(con, sql),
+    }
+    logger.warning(msgspec.json.encode(entry).decode())
+
+
+def log_write(
+    name: str,
+    statements: int,
+    seconds: float,
+    commit_seconds: float,
+    stats: RequestStats | None,
+) -> None:
+    """Write a slow write to the log.
+
+    Statements of a write are not logged one by one, so the entry names the function
+    and counts its statements instead of carrying SQL text.
+    """
+    start()
+    entry = {
+        "time": time(),
+        "endpoint": None if stats is None else stats.endpoint,
+        "write": name,
+        "statements": statements,
+        "seconds": seconds,
+        "commit_seconds": commit_seconds,
+    }
+    logger.warning(msgspec.json.encode(entry).decode())
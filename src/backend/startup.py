@@ -6,23 +6,57 @@ import contextlib
 import sqlite3
 from typing import TYPE_CHECKING
 
+from msgspec.structs import replace
 from reproca.method import method
 
-from .db import db
-from .misc import seconds_since_1970
-from .models import BIO, NAME, URL, Follower, Followers, Founder, Session, Startup
+from .cache import startup_cache, startup_prefixes, user_cache
+from .db import db, fetchall_into, write
+from .follow_graph import follow_graph, mutual_parameters
+from .leaderboard import LEADERBOARD_PAGE_SIZE, startup_leaderboard
+from .misc import (
+    MAX_PREFIX_LENGTH,
+    PREFIX_SEARCH_CANDIDATES,
+    PREFIX_SEARCH_LIMIT,
+    prefix_range,
+    seconds_since_1970,
+)
+from .models import (
+    BIO,
+    NAME,
+    URL,
+    Follower,
+    Followers,
+    Founder,
+    Session,
+    Startup,
+    StartupHandle,
+)
+from .statements import (
+    DELETE_STARTUP,
+    FOLLOW_STARTUP,
+    GET_STARTUP,
+    INSERT_STARTUP,
+    INSERT_STARTUP_FOUNDER,
+    SEARCH_STARTUPS,
+    STARTUP_FOUNDED_BY,
+    STARTUP_FOUNDER_IDS,
+    STARTUP_FOUNDERS,
+    STARTUP_HANDLE,
+    STARTUP_MUTUALS,
+    UNFOLLOW_STARTUP,
+    UPDATE_STARTUP,
+)
 
 if TYPE_CHECKING:
-    from sqlite3 import Cursor
+    from .db import AsyncCursor, Row
 
 
-def is_startup_founded_by(cur: Cursor, startup_id: int, founder_id: int) -> bool:
-    """Check if startup is founded by user."""
-    cur.execute(
-        "SELECT ID FROM Founder WHERE Startup = ? AND Founder = ?",
-        [startup_id, founder_id],
-    )
-    return cur.fetchone() is not None
+def is_startup_founded_by(
+    con: sqlite3.Connection, startup_id: int, founder_id: int
+) -> bool:
+    """Check if startup is founded by user, for use inside writes."""
+    row = con.execute(STARTUP_FOUNDED_BY, [startup_id, founder_id]).fetchone()
+    return row is not None
 
 
 @method
@@ -32,35 +66,45 @@ async def create_startup(
     """Create a startup."""
     if NAME.is_invalid(name) or BIO.is_invalid(description) or URL.is_invalid(banner):
         return None
-    con, cur = db()
-    cur.execute(
-        """
-        INSERT INTO Startup (Name, Description, Banner, FoundedAt, CreatedAt)
-        VALUES (?, ?, ?, ?, ?)
-        """,
-        [name, description, banner, founded_at, seconds_since_1970()],
-    )
-    startup_id = cur.lastrowid
+
+    def create(con: sqlite3.Connection) -> int | None:
+        startup_id = con.execute(
+            INSERT_STARTUP,
+            [name, description, banner, founded_at, seconds_since_1970()],
+        ).lastrowid
+        if startup_id is None:
+            return None
+        con.execute(
+            INSERT_STARTUP_FOUNDER,
+            [startup_id, session.id, founded_at, seconds_since_1970()],
+        )
+        return startup_id
+
+    startup_id = await write(create)
     if startup_id is None:
         return None
-    cur.execute(
-        """
-        INSERT INTO Founder (Startup, Founder, FoundedAt, CreatedAt) VALUES (?, ?, ?, ?)
-        """,
-        [startup_id, session.id, founded_at, seconds_since_1970()],
-    )
-    con.commit()
+    user_cache.invalidate(session.id)
+    startup_leaderboard.update(StartupHandle(startup_id, name, banner, 0))
     return startup_id
 
 
 @method
 async def delete_startup(session: Session, startup_id: int) -> None:
     """Only founders can delete startups."""
-    con, cur = db()
-    if not is_startup_founded_by(cur, startup_id, session.id):
+
+    def delete(con: sqlite3.Connection) -> list[Row] | None:
+        if not is_startup_founded_by(con, startup_id, session.id):
+            return None
+        founder_ids = con.execute(STARTUP_FOUNDER_IDS, [startup_id]).fetchall()
+        con.execute(DELETE_STARTUP, [startup_id])
+        return founder_ids
+
+    founder_ids = await write(delete)
+    if founder_ids is None:
         return
-    cur.execute("DELETE FROM Startup WHERE ID = ?", [startup_id])
-    con.commit()
+    startup_cache.invalidate(startup_id)
+    startup_leaderboard.remove(startup_id)
+    user_cache.invalidate(*(row.Founder for row in founder_ids))
 
 
 @method
@@ -75,109 +119,76 @@ async def update_startup(
     """Only founders can edit startups."""
     if NAME.is_invalid(name) or BIO.is_invalid(description) or URL.is_invalid(banner):
         return
-    con, cur = db()
-    if not is_startup_founded_by(cur, startup_id, session.id):
+
+    def update(con: sqlite3.Connection) -> tuple[list[Row], list[StartupHandle]] | None:
+        if not is_startup_founded_by(con, startup_id, session.id):
+            return None
+        con.execute(
+            UPDATE_STARTUP,
+            [name, description, banner, founded_at, startup_id],
+        )
+        return (
+            con.execute(STARTUP_FOUNDER_IDS, [startup_id]).fetchall(),
+            fetchall_into(con.cursor(), StartupHandle, STARTUP_HANDLE, [startup_id]),
+        )
+
+    if (updated := await write(update)) is None:
         return
-    cur.execute(
-        """
-        UPDATE Startup
-        SET Name = ?, Description = ?, Banner = ?, FoundedAt = ?
-        WHERE ID = ?
-        """,
-        [name, description, banner, founded_at, startup_id],
-    )
-    con.commit()
+    founder_ids, handles = updated
+    startup_cache.invalidate(startup_id)
+    user_cache.invalidate(*(row.Founder for row in founder_ids))
+    startup_leaderboard.update(*handles)
 
 
-@method
-async def get_startup(session: Session | None, startup_id: int) -> Startup | None:
-    """Get a startup."""
-    _con, cur = db()
-    cur.execute(
-        """
-        SELECT
-            Name,
-            Description,
-            Banner,
-            FoundedAt,
-            CreatedAt,
-            (SELECT COUNT(ID) FROM StartupFollower WHERE Following = Startup.ID)
-            FollowerCount,
-            (
-                SELECT TRUE FROM StartupFollower
-                WHERE Following = Startup.ID AND Follower = ?
-            )
-            IsFollowing
-        FROM Startup WHERE ID = ?
-        """,
-        [session and session.id, startup_id],
-    )
-    startup = cur.fetchone()
+async def load_startup(startup_id: int, cur: AsyncCursor) -> Startup | None:
+    """Read the viewer-independent parts of a startup's page and cache them."""
+    generation = startup_cache.generation
+    startup = await cur.fetchone(GET_STARTUP, [startup_id])
     if startup is None:
         return None
-    cur.execute(
-        """
-        SELECT User.ID, Username, Name, Avatar, StartupFollower.CreatedAt
-        FROM StartupFollower
-        INNER JOIN User ON User.ID = Follower
-        WHERE
-            Following = ?
-            AND Follower IN (SELECT Following FROM UserFollower WHERE Follower = ?)
-        LIMIT 4
-        """,
-        [startup_id, session and session.id],
-    )
-    followers = cur.fetchall()
-    cur.execute(
-        """
-        SELECT
-            User.ID,
-            Username,
-            Name,
-            Avatar,
-            Keynote,
-            FoundedAt,
-            (SELECT COUNT(ID) FROM UserFollower WHERE Following = User.ID)
-            FollowerCount
-        FROM Founder
-        INNER JOIN User ON Founder = User.ID
-        WHERE Startup = ?
-        """,
-        [startup_id],
-    )
-    founders = cur.fetchall()
-    return Startup(
+    cached = Startup(
         id=startup_id,
         name=startup.Name,
         description=startup.Description,
         banner=startup.Banner,
         founded_at=startup.FoundedAt,
         created_at=startup.CreatedAt,
-        founders=[
-            Founder(
-                id=founder.ID,
-                username=founder.Username,
-                name=founder.Name,
-                avatar=founder.Avatar,
-                keynote=founder.Keynote,
-                founded_at=founder.FoundedAt,
-                follower_count=founder.FollowerCount,
-            )
-            for founder in founders
-        ],
+        founders=await cur.fetchall_into(Founder, STARTUP_FOUNDERS, [startup_id]),
         followers=Followers(
-            mutuals=[
-                Follower(
-                    id=follower.ID,
-                    username=follower.Username,
-                    name=follower.Name,
-                    avatar=follower.Avatar,
-                    created_at=follower.CreatedAt,
+            mutuals=[], follower_count=startup.FollowerCount, is_following=False
+        ),
+    )
+    startup_cache.set(startup_id, cached, generation)
+    return cached
+
+
+@method
+async def get_startup(session: Session | None, startup_id: int) -> Startup | None:
+    """Get a startup."""
+    # Before checking out a connection, a refresh may wait for one of its own.
+    graph = await follow_graph.fresh()
+    async with db() as (_, cur):
+        startup = startup_cache.get(startup_id)
+        if startup is None:
+            startup = await load_startup(startup_id, cur)
+            if startup is None:
+                return None
+        is_following = False
+        mutuals = []
+        if session is not None:
+            is_following = graph.is_following_startup(session.id, startup_id)
+            if mutual_ids := graph.startup_mutuals(startup_id, session.id):
+                mutuals = await cur.fetchall_into(
+                    Follower,
+                    STARTUP_MUTUALS,
+                    mutual_parameters(startup_id, mutual_ids),
                 )
-                for follower in followers
-            ],
-            follower_count=startup.FollowerCount,
-            is_following=bool(startup.IsFollowing),
+    return replace(
+        startup,
+        followers=Followers(
+            mutuals=mutuals,
+            follower_count=graph.startup_followers.count(startup_id),
+            is_following=is_following,
         ),
     )
 
@@ -185,24 +196,56 @@ async def get_startup(session: Session | None, startup_id: int) -> Startup | Non
 @method
 async def follow_startup(session: Session, startup_id: int) -> None:
     """Follow a startup."""
-    con, cur = db()
-    with contextlib.suppress(sqlite3.IntegrityError):
-        cur.execute(
-            """
-            INSERT INTO StartupFollower (Follower, Following, CreatedAt)
-            VALUES (?, ?, ?)
-            """,
-            [session.id, startup_id, seconds_since_1970()],
-        )
-    con.commit()
+
+    def follow(con: sqlite3.Connection) -> list[StartupHandle]:
+        with contextlib.suppress(sqlite3.IntegrityError):
+            con.execute(FOLLOW_STARTUP, [session.id, startup_id, seconds_since_1970()])
+        return fetchall_into(con.cursor(), StartupHandle, STARTUP_HANDLE, [startup_id])
+
+    handles = await write(follow)
+    if handles:
+        follow_graph.set_startup(session.id, startup_id, followed=True)
+    startup_cache.invalidate(startup_id)
+    startup_leaderboard.update(*handles)
 
 
 @method
 async def unfollow_startup(session: Session, startup_id: int) -> None:
     """Unfollow a startup."""
-    con, cur = db()
-    cur.execute(
-        "DELETE FROM StartupFollower WHERE Follower = ? AND Following = ?",
-        [session.id, startup_id],
+
+    def unfollow(con: sqlite3.Connection) -> list[StartupHandle]:
+        con.execute(UNFOLLOW_STARTUP, [session.id, startup_id])
+        return fetchall_into(con.cursor(), StartupHandle, STARTUP_HANDLE, [startup_id])
+
+    handles = await write(unfollow)
+    follow_graph.set_startup(session.id, startup_id, followed=False)
+    startup_cache.invalidate(startup_id)
+    startup_leaderboard.update(*handles)
+
+
+@method
+async def top_startups(page: int) -> list[StartupHandle]:
+    """Return a page of the most followed startups."""
+    return await startup_leaderboard.page(
+        page * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE
     )
-    con.commit()
+
+
+@method
+async def search_startups(prefix: str) -> list[StartupHandle]:
+    """Find the most followed startups whose name starts with prefix."""
+    prefix = prefix.strip()
+    if not prefix or len(prefix) > MAX_PREFIX_LENGTH:
+        return []
+    if (handles := startup_prefixes.get(prefix)) is not None:
+        return handles
+    generation = startup_prefixes.generation
+    low, high = prefix_range(prefix)
+    async with db() as (_, cur):
+        handles = await cur.fetchall_into(
+            StartupHandle,
+            SEARCH_STARTUPS,
+            [low, high, PREFIX_SEARCH_CANDIDATES, PREFIX_SEARCH_LIMIT],
+        )
+    startup_prefixes.set(prefix, handles, generation)
+    return handles
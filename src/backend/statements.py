@@ -0,0 +1,706 @@
+"""Named SQL statements used by the endpoints.
+
+Every statement is registered in `statements` so its query plan can be checked
+against the current schema with `find_scans`.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import sqlite3
+
+
+class Statement(str):
+    """SQL statement registered under a name."""
+
+    name: str
+    scan: bool
+
+    def __new__(cls, name: str, sql: str, *, scan: bool) -> Statement:  # noqa: PYI034
+        """Create the statement, `scan` marks table scans as expected."""
+        self = super().__new__(cls, sql)
+        self.name = name
+        self.scan = scan
+        return self
+
+
+statements: dict[str, Statement] = {}
+
+
+def statement(name: str, sql: str, *, scan: bool = False) -> Statement:
+    """Register a statement under a unique name."""
+    if name in statements:
+        msg = f"Statement {name!r} is already registered."
+        raise ValueError(msg)
+    statements[name] = Statement(name, sql, scan=scan)
+    return statements[name]
+
+
+def query_plan(con: sqlite3.Connection, sql: str) -> list[str]:
+    """Return the EXPLAIN QUERY PLAN details of a statement, binding NULLs."""
+    parameters = [None] * sql.count("?")
+    return [row.detail for row in con.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)]
+
+
+def find_table_scans(plan: list[str]) -> list[str]:
+    """Return query plan steps that scan a table or one of its indexes.
+
+    Scans of virtual tables, constant rows and materialized subqueries are fine.
+    """
+    materialized = {
+        step.removeprefix("MATERIALIZE ")
+        for step in plan
+        if step.startswith("MATERIALIZE ")
+    }
+    return [
+        step
+        for step in plan
+        if step.startswith("SCAN ")
+        and step.removeprefix("SCAN ") not in materialized
+        and not any(
+            kind in step for kind in ("VIRTUAL TABLE", "CONSTANT ROW", "(subquery")
+        )
+    ]
+
+
+def find_scans(con: sqlite3.Connection) -> dict[str, list[str]]:
+    """Return table scan steps of every statement not registered with scan=True."""
+    scans: dict[str, list[str]] = {}
+    for name, sql in statements.items():
+        if sql.scan:
+            continue
+        if steps := find_table_scans(query_plan(con, sql)):
+            scans[name] = steps
+    return scans
+
+
+# Columns in `Blog` field order. IsPoll is selected into `poll` and replaced with
+# the actual poll by `blog.attach_polls`.
+BLOG_COLUMNS = """
+    B.Author author_id,
+    U.Username username,
+    U.Name name,
+    U.Avatar avatar,
+    U.FollowerCount follower_count,
+    B.ID blog_id,
+    B.Title title,
+    B.Content content,
+    B.IsPoll poll,
+    B.CreatedAt created_at
+"""
+
+# Sessions, keyed by the SHA-256 of the session ID sent in the cookie
+
+INSERT_SESSION = statement(
+    "insert_session",
+    "INSERT INTO Session (ID, User, CreatedAt, ExpiresAt) VALUES (?, ?, ?, ?)",
+)
+
+GET_SESSION = statement(
+    "get_session",
+    """
+    SELECT
+        U.ID id,
+        Username username,
+        Name name,
+        Email email,
+        Avatar avatar,
+        Link link,
+        Bio bio,
+        U.CreatedAt created_at,
+        LastSeenAt last_seen_at,
+        S.ExpiresAt expires_at
+    FROM Session S
+    INNER JOIN User U ON U.ID = S.User
+    WHERE S.ID = ? AND S.ExpiresAt > ?
+    """,
+)
+
+DELETE_SESSION = statement("delete_session", "DELETE FROM Session WHERE ID = ?")
+
+DELETE_EXPIRED_SESSIONS = statement(
+    "delete_expired_sessions",
+    "DELETE FROM Session WHERE ExpiresAt <= ?",
+)
+
+# Follow graph, see `follow_graph`
+
+USER_FOLLOWS = statement(
+    "user_follows", "SELECT Follower, Following FROM UserFollower", scan=True
+)
+
+STARTUP_FOLLOWS = statement(
+    "startup_follows", "SELECT Follower, Following FROM StartupFollower", scan=True
+)
+
+LAST_FOLLOW_CHANGE = statement(
+    "last_follow_change", "SELECT COALESCE(MAX(ID), 0) FROM FollowChange"
+)
+
+FOLLOW_CHANGES = statement(
+    "follow_changes",
+    """
+    SELECT ID, Startup, Follower, Following, Followed FROM FollowChange
+    WHERE ID > ?
+    ORDER BY ID
+    """,
+)
+
+# Users
+
+UPDATE_LAST_SEEN = statement(
+    "update_last_seen",
+    "UPDATE User SET LastSeenAt = ? WHERE ID = ?",
+)
+
+LOGIN_USER = statement(
+    "login_user",
+    """
+    SELECT ID, Password, Name, Email, Avatar, Link, Bio, CreatedAt, LastSeenAt
+    FROM User
+    WHERE Username = ?
+    """,
+)
+
+UPDATE_PASSWORD = statement(
+    "update_password",
+    "UPDATE User SET Password = ? WHERE ID = ?",
+)
+
+USER_ID_BY_USERNAME = statement(
+    "user_id_by_username",
+    "SELECT ID FROM User WHERE Username = ?",
+)
+
+INSERT_USER = statement(
+    "insert_user",
+    """
+    INSERT INTO User (
+        Username,
+        Password,
+        Name,
+        Email,
+        Avatar,
+        Bio,
+        Link,
+        CreatedAt,
+        LastSeenAt
+    )
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+)
+
+USER_PASSWORD = statement("user_password", "SELECT Password FROM User WHERE ID = ?")
+
+UPDATE_USER = statement(
+    "update_user",
+    """
+    UPDATE User SET Name = ?, Email = ?, Avatar = ?, Bio = ?, Link = ?
+    WHERE ID = ?
+    """,
+)
+
+FOLLOW_USER = statement(
+    "follow_user",
+    """
+    INSERT INTO UserFollower (Follower, Following, CreatedAt)
+    VALUES (?, ?, ?)
+    """,
+)
+
+UNFOLLOW_USER = statement(
+    "unfollow_user",
+    "DELETE FROM UserFollower WHERE Follower = ? AND Following = ?",
+)
+
+GET_USER = statement(
+    "get_user",
+    """
+    SELECT
+        ID,
+        Name,
+        Email,
+        Link,
+        Avatar,
+        Bio,
+        CreatedAt,
+        LastSeenAt,
+        FollowerCount
+    FROM User
+    WHERE Username = ?
+    """,
+)
+
+USER_MUTUALS = statement(
+    "user_mutuals",
+    """
+    SELECT
+        User.ID id,
+        Username username,
+        Name name,
+        Avatar avatar,
+        UserFollower.CreatedAt created_at
+    FROM UserFollower
+    INNER JOIN User ON User.ID = Follower
+    WHERE Following = ? AND Follower IN (?, ?, ?, ?)
+    """,
+)
+
+# IsPoll is selected into `poll` like in `BLOG_COLUMNS`.
+USER_BLOGS = statement(
+    "user_blogs",
+    """
+    SELECT ID id, Title title, Content content, IsPoll poll, CreatedAt created_at
+    FROM Blog
+    WHERE Author = ?
+    ORDER BY CreatedAt DESC
+    """,
+)
+
+USER_STARTUPS = statement(
+    "user_startups",
+    """
+    SELECT
+        Startup.ID id,
+        Name name,
+        Description description,
+        Keynote keynote,
+        Banner banner,
+        Founder.FoundedAt founded_at,
+        Startup.CreatedAt created_at,
+        Startup.FollowerCount follower_count
+    FROM Startup
+    JOIN Founder
+    ON Startup = Startup.ID
+    WHERE Founder = ?
+    ORDER BY Founder.FoundedAt DESC
+    """,
+)
+
+FIND_USER = statement(
+    "find_user",
+    """
+    SELECT
+        ID,
+        Name,
+        Avatar,
+        FollowerCount
+    FROM User
+    WHERE Username = ?
+    """,
+)
+
+TOP_USERS = statement(
+    "top_users",
+    """
+    SELECT
+        ID id,
+        Username username,
+        Name name,
+        Avatar avatar,
+        FollowerCount follower_count
+    FROM User
+    ORDER BY FollowerCount DESC, ID DESC
+    LIMIT ?
+    """,
+    scan=True,
+)
+
+USER_HANDLE = statement(
+    "user_handle",
+    """
+    SELECT
+        ID id,
+        Username username,
+        Name name,
+        Avatar avatar,
+        FollowerCount follower_count
+    FROM User
+    WHERE ID = ?
+    """,
+)
+
+SUGGESTED_USERS = statement(
+    "suggested_users",
+    """
+    SELECT
+        User.ID id,
+        Username username,
+        Name name,
+        Avatar avatar,
+        FollowerCount follower_count
+    FROM Suggestion
+    INNER JOIN User ON User.ID = Suggested
+    WHERE Suggestion.User = ?
+    ORDER BY Rank
+    """,
+)
+
+# Candidates are taken from the start of each name range in index order, then the
+# most followed of them are returned.
+SEARCH_USERS = statement(
+    "search_users",
+    """
+    SELECT * FROM (
+        SELECT
+            ID id,
+            Username username,
+            Name name,
+            Avatar avatar,
+            FollowerCount follower_count
+        FROM User
+        WHERE Username >= ? COLLATE NOCASE AND Username < ? COLLATE NOCASE
+        ORDER BY Username COLLATE NOCASE
+        LIMIT ?
+    )
+    UNION
+    SELECT * FROM (
+        SELECT
+            ID id,
+            Username username,
+            Name name,
+            Avatar avatar,
+            FollowerCount follower_count
+        FROM User
+        WHERE Name >= ? COLLATE NOCASE AND Name < ? COLLATE NOCASE
+        ORDER BY Name COLLATE NOCASE
+        LIMIT ?
+    )
+    ORDER BY follower_count DESC, id
+    LIMIT ?
+    """,
+)
+
+# Blogs and polls
+
+INSERT_BLOG = statement(
+    "insert_blog",
+    """
+    INSERT INTO Blog (Author, Title, Content, IsPoll, CreatedAt)
+    VALUES (?, ?, ?, ?, ?)
+    """,
+)
+
+INSERT_POLL_OPTION = statement(
+    "insert_poll_option",
+    """
+    INSERT INTO PollOption (Blog, Option) VALUES (?, ?)
+    """,
+)
+
+DELETE_BLOG = statement("delete_blog", "DELETE FROM Blog WHERE ID = ? AND Author = ?")
+
+GET_BLOGS = statement(
+    "get_blogs",
+    f"""
+    SELECT {BLOG_COLUMNS}
+    FROM Blog B
+    INNER JOIN User U ON B.Author = U.ID
+    ORDER BY B.CreatedAt DESC
+    """,  # noqa: S608
+    scan=True,
+)
+
+BLOG_PAGE_AFTER = statement(
+    "blog_page_after",
+    f"""
+    SELECT {BLOG_COLUMNS}
+    FROM Blog B
+    INNER JOIN User U ON B.Author = U.ID
+    WHERE (B.CreatedAt, B.ID) < (?, ?)
+    ORDER BY B.CreatedAt DESC, B.ID DESC
+    LIMIT ?
+    """,  # noqa: S608
+)
+
+BLOG_PAGE = statement(
+    "blog_page",
+    f"""
+    SELECT {BLOG_COLUMNS}
+    FROM Blog B
+    INNER JOIN User U ON B.Author = U.ID
+    ORDER BY B.CreatedAt DESC, B.ID DESC
+    LIMIT ?
+    """,  # noqa: S608
+    scan=True,
+)
+
+# Ordered by the BM25 rank configured on BlogSearch, which weighs titles higher.
+SEARCH_BLOGS = statement(
+    "search_blogs",
+    f"""
+    SELECT {BLOG_COLUMNS}, snippet(BlogSearch, -1, ?, ?, '…', 16) snippet
+    FROM BlogSearch
+    INNER JOIN Blog B ON B.ID = BlogSearch.rowid
+    INNER JOIN User U ON B.Author = U.ID
+    WHERE BlogSearch MATCH ?
+    ORDER BY BlogSearch.rank, B.ID DESC
+    LIMIT ? OFFSET ?
+    """,  # noqa: S608
+)
+
+POLL_OPTIONS = statement(
+    "poll_options",
+    """
+    SELECT Blog, ID, Option, Votes
+    FROM PollOption
+    WHERE Blog IN (SELECT value FROM json_each(?))
+    ORDER BY ID
+    """,
+)
+
+POLL_VOTES = statement(
+    "poll_votes",
+    """
+    SELECT Blog, Option FROM PollVote
+    WHERE Voter = ? AND Blog IN (SELECT value FROM json_each(?))
+    """,
+)
+
+# Only counts options of the given blog, a vote for another blog's option is a no-op.
+VOTE_POLL = statement(
+    "vote_poll",
+    """
+    INSERT INTO PollVote (Blog, Option, Voter)
+    SELECT Blog, ID, ? FROM PollOption WHERE ID = ? AND Blog = ?
+    ON CONFLICT (Blog, Voter) DO UPDATE SET Option = excluded.Option
+    WHERE Option <> excluded.Option
+    """,
+)
+
+# An author who follows themselves gets the post once, as its author.
+FAN_OUT_BLOG = statement(
+    "fan_out_blog",
+    """
+    INSERT INTO Timeline (Owner, Blog, CreatedAt)
+    SELECT Follower, ?, ? FROM UserFollower
+    WHERE Following = ? AND Follower <> Following AND (SELECT FollowerCount FROM User WHERE ID = ?) <= ?
+    UNION ALL
+    SELECT ?, ?, ?
+    """,
+)
+
+BACKFILL_TIMELINE = statement(
+    "backfill_timeline",
+    """
+    INSERT OR IGNORE INTO Timeline (Owner, Blog, CreatedAt)
+    SELECT ?, ID, CreatedAt FROM Blog
+    WHERE Author = ?
+    ORDER BY CreatedAt DESC
+    LIMIT ?
+    """,
+)
+
+UNFOLLOW_TIMELINE = statement(
+    "unfollow_timeline",
+    """
+    DELETE FROM Timeline
+    WHERE Owner = ? AND Blog IN (SELECT ID FROM Blog WHERE Author = ?)
+    """,
+)
+
+# Posts fanned out to the owner's timeline, merged with posts pulled from followed
+# authors with more than the fan-out limit of followers.
+TIMELINE = statement(
+    "timeline",
+    f"""
+    SELECT {BLOG_COLUMNS}
+    FROM (
+        SELECT Blog, CreatedAt FROM Timeline
+        WHERE Owner = ? AND (CreatedAt, Blog) < (?, ?)
+        UNION
+        SELECT Blog.ID, Blog.CreatedAt FROM UserFollower
+        INNER JOIN User ON User.ID = UserFollower.Following
+        INNER JOIN Blog ON Blog.Author = UserFollower.Following
+        WHERE
+            UserFollower.Follower = ?
+            AND User.FollowerCount > ?
+            AND (Blog.CreatedAt, Blog.ID) < (?, ?)
+        ORDER BY CreatedAt DESC, Blog DESC
+        LIMIT ?
+    ) T
+    INNER JOIN Blog B ON B.ID = T.Blog
+    INNER JOIN User U ON B.Author = U.ID
+    ORDER BY B.CreatedAt DESC, B.ID DESC
+    """,  # noqa: S608
+)
+
+# Startups
+
+STARTUP_FOUNDED_BY = statement(
+    "startup_founded_by",
+    "SELECT ID FROM Founder WHERE Startup = ? AND Founder = ?",
+)
+
+INSERT_STARTUP = statement(
+    "insert_startup",
+    """
+    INSERT INTO Startup (Name, Description, Banner, FoundedAt, CreatedAt)
+    VALUES (?, ?, ?, ?, ?)
+    """,
+)
+
+INSERT_STARTUP_FOUNDER = statement(
+    "insert_startup_founder",
+    """
+    INSERT INTO Founder (Startup, Founder, FoundedAt, CreatedAt)
+    VALUES (?, ?, ?, ?)
+    """,
+)
+
+DELETE_STARTUP = statement("delete_startup", "DELETE FROM Startup WHERE ID = ?")
+
+UPDATE_STARTUP = statement(
+    "update_startup",
+    """
+    UPDATE Startup
+    SET Name = ?, Description = ?, Banner = ?, FoundedAt = ?
+    WHERE ID = ?
+    """,
+)
+
+GET_STARTUP = statement(
+    "get_startup",
+    """
+    SELECT
+        Name,
+        Description,
+        Banner,
+        FoundedAt,
+        CreatedAt,
+        FollowerCount
+    FROM Startup WHERE ID = ?
+    """,
+)
+
+STARTUP_FOUNDER_IDS = statement(
+    "startup_founder_ids",
+    "SELECT Founder FROM Founder WHERE Startup = ?",
+)
+
+FOUNDER_STARTUP_IDS = statement(
+    "founder_startup_ids",
+    "SELECT Startup FROM Founder WHERE Founder = ?",
+)
+
+STARTUP_MUTUALS = statement(
+    "startup_mutuals",
+    """
+    SELECT
+        User.ID id,
+        Username username,
+        Name name,
+        Avatar avatar,
+        StartupFollower.CreatedAt created_at
+    FROM StartupFollower
+    INNER JOIN User ON User.ID = Follower
+    WHERE Following = ? AND Follower IN (?, ?, ?, ?)
+    """,
+)
+
+STARTUP_FOUNDERS = statement(
+    "startup_founders",
+    """
+    SELECT
+        User.ID id,
+        Username username,
+        Name name,
+        Avatar avatar,
+        Keynote keynote,
+        FoundedAt founded_at,
+        FollowerCount follower_count
+    FROM Founder
+    INNER JOIN User ON Founder = User.ID
+    WHERE Startup = ?
+    """,
+)
+
+TOP_STARTUPS = statement(
+    "top_startups",
+    """
+    SELECT
+        ID id,
+        Name name,
+        Banner banner,
+        FollowerCount follower_count
+    FROM Startup
+    ORDER BY FollowerCount DESC, ID DESC
+    LIMIT ?
+    """,
+    scan=True,
+)
+
+STARTUP_HANDLE = statement(
+    "startup_handle",
+    """
+    SELECT
+        ID id,
+        Name name,
+        Banner banner,
+        FollowerCount follower_count
+    FROM Startup
+    WHERE ID = ?
+    """,
+)
+
+SEARCH_STARTUPS = statement(
+    "search_startups",
+    """
+    SELECT * FROM (
+        SELECT
+            ID id,
+            Name name,
+            Banner banner,
+            FollowerCount follower_count
+        FROM Startup
+        WHERE Name >= ? COLLATE NOCASE AND Name < ? COLLATE NOCASE
+        ORDER BY Name COLLATE NOCASE
+        LIMIT ?
+    )
+    ORDER BY follower_count DESC, id
+    LIMIT ?
+    """,
+)
+
+FOLLOW_STARTUP = statement(
+    "follow_startup",
+    """
+    INSERT INTO StartupFollower (Follower, Following, CreatedAt)
+    VALUES (?, ?, ?)
+    """,
+)
+
+UNFOLLOW_STARTUP = statement(
+    "unfollow_startup",
+    "DELETE FROM StartupFollower WHERE Follower = ? AND Following = ?",
+)
+
+# Founders
+
+ADD_FOUNDER = statement(
+    "add_founder",
+    """
+    INSERT INTO Founder (Startup, Founder, Keynote, FoundedAt, CreatedAt)
+    VALUES (?, ?, ?, ?, ?)
+    """,
+)
+
+EDIT_FOUNDER = statement(
+    "edit_founder",
+    """
+    UPDATE Founder SET Keynote = ?, FoundedAt = ?
+    WHERE Startup = ? AND Founder = ?
+    """,
+)
+
+COUNT_FOUNDERS = statement(
+    "count_founders",
+    "SELECT COUNT(ID) Count FROM Founder WHERE Startup = ?",
+)
+
+REMOVE_FOUNDER = statement(
+    "remove_founder",
+    "DELETE FROM Founder WHERE Startup = ? AND Founder = ?",
+)
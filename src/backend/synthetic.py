@@ -0,0 +1,323 @@
+"""Generate a synthetic dataset straight into the database for scale testing.
+
+Run with `rye run synthetic -- --users 100000 --follows 10000000 ...`. The same
+arguments always produce the same rows. Every synthetic user's password is
+`password`.
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import sqlite3
+from bisect import bisect
+from random import Random
+from time import perf_counter
+from typing import TYPE_CHECKING, Any
+
+from . import DATABASE, migrate
+from .blog import FAN_OUT_LIMIT
+from .db import PRAGMAS
+from .password import argon2_hasher
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Iterator
+
+# Users are created at one of this many times, so that only this many password
+# hashes have to be computed.
+PASSWORD_BUCKETS = 64
+YEAR = 365 * 24 * 60 * 60
+
+WORDS = """
+ai app b2b beta billing bootstrap build cloud code community cost customer data
+deploy design developer distributed edge engineer equity feature fintech founder
+funding growth hardware hiring idea infra investor launch market metrics mobile
+model network open pitch platform product profit quantum remote revenue robotics
+runway saas scale seed series ship software stack startup storage team tooling
+traction users valuation vector venture web workflow
+""".split()
+FIRST_NAMES = """
+Aarav Ada Alan Amara Ben Chen Dana Diego Elena Farah Grace Hana Ibrahim Ivy Jonas
+Kai Lena Liam Maya Mei Noah Omar Priya Quinn Ravi Sara Tomas Uma Wei Yara Zoe
+""".split()
+LAST_NAMES = """
+Ahmed Becker Costa Dubois Evans Fischer Garcia Hoang Ito Jensen Kim Lopez Mehta
+Novak Okafor Park Rossi Sato Silva Singh Tanaka Umar Volkov Wang Yilmaz Zhang
+""".split()
+
+
+class PowerLaw:
+    """Sample IDs with Zipf-like popularity, the most popular ones shuffled."""
+
+    def __init__(self, random: Random, ids: range, exponent: float) -> None:
+        """Assign a random popularity rank to each ID."""
+        self.random = random
+        self.ids = list(ids)
+        random.shuffle(self.ids)
+        self.weights = list(
+            itertools.accumulate(
+                1 / rank**exponent for rank in range(1, len(self.ids) + 1)
+            )
+        )
+
+    def sample(self) -> int:
+        """Return one ID, popular IDs are returned more often."""
+        point = self.random.random() * self.weights[-1]
+        return self.ids[min(bisect(self.weights, point), len(self.ids) - 1)]
+
+
+def sentence(random: Random, low: int, high: int) -> str:
+    """Return between low and high random words."""
+    return " ".join(random.choices(WORDS, k=random.randint(low, high)))
+
+
+def next_id(con: sqlite3.Connection, table: str) -> int:
+    """Return the first free ID, new rows get explicit IDs counting up from it."""
+    return con.execute(f"SELECT COALESCE(MAX(ID), 0) + 1 FROM {table}").fetchone()[0]  # noqa: S608
+
+
+def insert(
+    con: sqlite3.Connection, table: str, sql: str, rows: Iterable[Any], batch: int
+) -> None:
+    """Insert rows with executemany, committing every `batch` rows."""
+    start = perf_counter()
+    total = 0
+    iterator = iter(rows)
+    while chunk := list(itertools.islice(iterator, batch)):
+        con.execute("BEGIN")
+        cursor = con.executemany(sql, chunk)
+        con.commit()
+        # rowcount leaves out ignored duplicates and rows written by triggers.
+        total += cursor.rowcount
+    print(f"Inserted {total} {table} rows in {perf_counter() - start:.1f}s")
+
+
+def generate(con: sqlite3.Connection, args: argparse.Namespace) -> None:  # noqa: C901, PLR0914, PLR0915
+    """Insert all synthetic rows."""
+    random = Random(args.seed)  # noqa: S311
+    now = args.now
+    first_user = next_id(con, "User")
+    user_ids = range(first_user, first_user + args.users)
+    first_startup = next_id(con, "Startup")
+    startup_ids = range(first_startup, first_startup + args.startups)
+    first_blog = next_id(con, "Blog")
+    blog_ids = range(first_blog, first_blog + args.blogs)
+    buckets = [
+        now - YEAR + YEAR * i // PASSWORD_BUCKETS for i in range(PASSWORD_BUCKETS)
+    ]
+    hashes = {
+        created_at: argon2_hasher.hash(f"password{created_at}")
+        for created_at in buckets
+    }
+    created: dict[int, int] = {}
+
+    def users() -> Iterator[tuple[Any, ...]]:
+        for user_id in user_ids:
+            created_at = random.choice(buckets)
+            created[user_id] = created_at
+            name = f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
+            yield (
+                user_id,
+                f"user{user_id}",
+                hashes[created_at],
+                name,
+                f"user{user_id}@example.com",
+                "",
+                sentence(random, 5, 25),
+                "",
+                created_at,
+                random.randint(created_at, now),
+            )
+
+    insert(
+        con,
+        "User",
+        "INSERT INTO User (ID, Username, Password, Name, Email, Avatar, Bio, Link, "
+        "CreatedAt, LastSeenAt) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        users(),
+        args.batch,
+    )
+    popular_users = PowerLaw(random, user_ids, args.exponent)
+
+    def follows() -> Iterator[tuple[int, int, int]]:
+        for _ in range(args.follows):
+            follower = random.choice(user_ids)
+            following = popular_users.sample()
+            if follower != following:
+                since = max(created[follower], created[following])
+                yield follower, following, random.randint(since, now)
+
+    insert(
+        con,
+        "UserFollower",
+        "INSERT OR IGNORE INTO UserFollower (Follower, Following, CreatedAt) "
+        "VALUES (?, ?, ?)",
+        follows(),
+        args.batch,
+    )
+    # Prolific authors are not necessarily the most followed ones.
+    authors = PowerLaw(random, user_ids, args.exponent)
+    times = sorted(random.randint(now - YEAR, now) for _ in blog_ids)
+    polls: list[tuple[int, list[int]]] = []
+    option_ids = itertools.count(next_id(con, "PollOption"))
+
+    def blogs() -> Iterator[tuple[Any, ...]]:
+        for blog_id, created_at in zip(blog_ids, times):
+            is_poll = random.random() < args.poll_ratio
+            if is_poll:
+                ids = [next(option_ids) for _ in range(random.randint(2, 4))]
+                polls.append((blog_id, ids))
+            yield (
+                blog_id,
+                authors.sample(),
+                sentence(random, 3, 10).capitalize(),
+                sentence(random, 20, 200),
+                is_poll,
+                created_at,
+            )
+
+    def options() -> Iterator[tuple[int, int, str]]:
+        for blog_id, ids in polls:
+            for number, id_ in enumerate(ids, 1):
+                yield id_, blog_id, f"Option {number}"
+
+    insert(
+        con,
+        "Blog",
+        "INSERT INTO Blog (ID, Author, Title, Content, IsPoll, CreatedAt) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        blogs(),
+        args.batch,
+    )
+    insert(
+        con,
+        "PollOption",
+        "INSERT INTO PollOption (ID, Blog, Option) VALUES (?, ?, ?)",
+        options(),
+        args.batch,
+    )
+
+    def votes() -> Iterator[tuple[int, int, int]]:
+        for blog_id, ids in polls:
+            count = min(int(random.expovariate(1 / args.votes)), len(user_ids))
+            for voter in random.sample(user_ids, count):
+                yield blog_id, voter, random.choice(ids)
+
+    insert(
+        con,
+        "PollVote",
+        "INSERT OR IGNORE INTO PollVote (Blog, Voter, Option) VALUES (?, ?, ?)",
+        votes(),
+        args.batch,
+    )
+
+    def startups() -> Iterator[tuple[Any, ...]]:
+        for startup_id in startup_ids:
+            founded_at = random.randint(now - 10 * YEAR, now)
+            yield (
+                startup_id,
+                sentence(random, 1, 3).title(),
+                sentence(random, 10, 40),
+                "",
+                founded_at,
+                random.randint(max(founded_at, now - YEAR), now),
+            )
+
+    insert(
+        con,
+        "Startup",
+        "INSERT INTO Startup (ID, Name, Description, Banner, FoundedAt, CreatedAt) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        startups(),
+        args.batch,
+    )
+
+    def founders() -> Iterator[tuple[Any, ...]]:
+        for startup_id in startup_ids:
+            count = min(1 + int(random.expovariate(1 / args.founders)), len(user_ids))
+            for founder in random.sample(user_ids, count):
+                yield startup_id, founder, sentence(random, 5, 15), now, now
+
+    insert(
+        con,
+        "Founder",
+        "INSERT INTO Founder (Startup, Founder, Keynote, FoundedAt, CreatedAt) "
+        "VALUES (?, ?, ?, ?, ?)",
+        founders(),
+        args.batch,
+    )
+    popular_startups = PowerLaw(random, startup_ids, args.exponent)
+
+    def startup_follows() -> Iterator[tuple[int, int, int]]:
+        if not startup_ids:
+            return
+        for _ in range(args.startup_follows):
+            yield random.choice(user_ids), popular_startups.sample(), now
+
+    insert(
+        con,
+        "StartupFollower",
+        "INSERT OR IGNORE INTO StartupFollower (Follower, Following, CreatedAt) "
+        "VALUES (?, ?, ?)",
+        startup_follows(),
+        args.batch,
+    )
+    if args.timeline:
+        start = perf_counter()
+        con.execute("BEGIN")
+        # Same rows as `blog.post_blog` writes, authors past the fan-out limit are
+        # read at request time instead.
+        con.execute(
+            """
+            INSERT OR IGNORE INTO Timeline (Owner, Blog, CreatedAt)
+            SELECT Author, ID, CreatedAt FROM Blog WHERE ID >= ?
+            UNION ALL
+            SELECT F.Follower, B.ID, B.CreatedAt
+            FROM Blog B
+            INNER JOIN User U ON U.ID = B.Author
+            INNER JOIN UserFollower F ON F.Following = B.Author
+            WHERE B.ID >= ? AND U.FollowerCount <= ?
+            """,
+            [first_blog, first_blog, FAN_OUT_LIMIT],
+        )
+        con.commit()
+        print(f"Filled Timeline in {perf_counter() - start:.1f}s")
+
+
+def main() -> None:
+    """Parse arguments, migrate the database and generate the dataset."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--now", type=int, default=1_735_689_600)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument(
+        "--follows", type=int, default=100_000, help="follow edges to attempt"
+    )
+    parser.add_argument("--blogs", type=int, default=100_000)
+    parser.add_argument("--poll-ratio", type=float, default=0.1)
+    parser.add_argument("--votes", type=float, default=20, help="mean votes per poll")
+    parser.add_argument("--startups", type=int, default=1_000)
+    parser.add_argument(
+        "--founders", type=float, default=2, help="mean founders per startup"
+    )
+    parser.add_argument("--startup-follows", type=int, default=20_000)
+    parser.add_argument(
+        "--exponent", type=float, default=1.0, help="power-law exponent of popularity"
+    )
+    parser.add_argument("--batch", type=int, default=100_000, help="rows per commit")
+    parser.add_argument(
+        "--no-timeline",
+        dest="timeline",
+        action="store_false",
+        help="skip filling Timeline, which gets large for dense follow graphs",
+    )
+    args = parser.parse_args()
+    migrate()
+    con = sqlite3.connect(DATABASE, isolation_level=None)
+    con.executescript(PRAGMAS)
+    # The dataset can be regenerated, so durability is traded for speed.
+    con.execute("PRAGMA synchronous = OFF")
+    try:
+        generate(con, args)
+    finally:
+        con.close()
@@ -4,14 +4,25 @@ from __future__ import annotations
 
 import contextlib
 import sqlite3
+from typing import TYPE_CHECKING
 
+from msgspec.structs import replace
 from reproca.credentials import Credentials  # noqa: TCH002
 from reproca.method import method
 
-from . import sessions
-from .blog import get_poll
-from .db import Row, db
-from .misc import seconds_since_1970
+from .blog import TIMELINE_BACKFILL, get_polls
+from .cache import startup_cache, user_cache, user_ids, user_prefixes
+from .db import Row, db, fetchall_into, write
+from .follow_graph import follow_graph, mutual_parameters
+from .last_seen import GRANULARITY, last_seen
+from .leaderboard import LEADERBOARD_PAGE_SIZE, user_leaderboard
+from .misc import (
+    MAX_PREFIX_LENGTH,
+    PREFIX_SEARCH_CANDIDATES,
+    PREFIX_SEARCH_LIMIT,
+    prefix_range,
+    seconds_since_1970,
+)
 from .models import (
     BIO,
     EMAIL,
@@ -27,24 +38,42 @@ from .models import (
     UserHandle,
     UserStartup,
 )
-from .password import (
-    hash_password,
-    is_password_matching,
-    password_needs_rehash,
+from .password import hash_password, is_password_matching, password_needs_rehash
+from .session_store import session_store
+from .statements import (
+    BACKFILL_TIMELINE,
+    FIND_USER,
+    FOLLOW_USER,
+    FOUNDER_STARTUP_IDS,
+    GET_USER,
+    INSERT_USER,
+    LOGIN_USER,
+    SEARCH_USERS,
+    SUGGESTED_USERS,
+    UNFOLLOW_TIMELINE,
+    UNFOLLOW_USER,
+    UPDATE_PASSWORD,
+    UPDATE_USER,
+    USER_BLOGS,
+    USER_HANDLE,
+    USER_ID_BY_USERNAME,
+    USER_MUTUALS,
+    USER_PASSWORD,
+    USER_STARTUPS,
 )
 
+if TYPE_CHECKING:
+    from .db import AsyncCursor
+
 
 @method
 async def get_session(session: Session | None) -> Session | None:
     """Return session user."""
     if session is not None:
-        con, cur = db()
-        session.last_seen_at = seconds_since_1970()
-        cur.execute(
-            "UPDATE User SET LastSeenAt = ? WHERE ID = ?",
-            [session.last_seen_at, session.id],
-        )
-        con.commit()
+        now = seconds_since_1970()
+        if now - session.last_seen_at >= GRANULARITY:
+            session.last_seen_at = now
+            last_seen.record(session.id, now)
     return session
 
 
@@ -53,26 +82,17 @@ async def login(credentials: Credentials, username: str, password: str) -> bool:
     """Login to account."""
     if USERNAME.is_invalid(username) or PASSWORD.is_invalid(password):
         return False
-    con, cur = db()
-    cur.execute(
-        """
-        SELECT ID, Password, Name, Email, Avatar, Link, Bio, CreatedAt, LastSeenAt
-        FROM User
-        WHERE Username = ?
-        """,
-        [username],
-    )
-    row: Row | None = cur.fetchone()
-    if row is None or not is_password_matching(row.Password, password, row.CreatedAt):
+    async with db() as (_, cur):
+        row: Row | None = await cur.fetchone(LOGIN_USER, [username])
+    if row is None or not await is_password_matching(
+        row.Password, password, row.CreatedAt
+    ):
         return False
     if password_needs_rehash(row.Password):
-        cur.execute(
-            "UPDATE User SET Password = ? WHERE ID = ?",
-            [hash_password(password, row.CreatedAt), row.ID],
-        )
-        con.commit()
+        new_hash = await hash_password(password, row.CreatedAt)
+        await write(lambda con: con.execute(UPDATE_PASSWORD, [new_hash, row.ID]))
     credentials.set_session(
-        sessions.create(
+        await session_store.insert(
             row.ID,
             Session(
                 id=row.ID,
@@ -94,7 +114,7 @@ async def login(credentials: Credentials, username: str, password: str) -> bool:
 async def logout(credentials: Credentials) -> None:
     """Logout from account."""
     if sessionid := credentials.get_session():
-        sessions.remove_by_sessionid(sessionid)
+        await session_store.delete(sessionid)
     credentials.set_session(None)
 
 
@@ -119,30 +139,34 @@ async def register(
         or URL.is_invalid(link)
     ):
         return False
-    con, cur = db()
-    cur.execute("SELECT ID FROM User WHERE Username = ?", [username])
-    if cur.fetchone():
-        return False
+    async with db() as (_, cur):
+        if await cur.fetchone(USER_ID_BY_USERNAME, [username]):
+            return False
     created_at = seconds_since_1970()
-    cur.execute(
-        """
-        INSERT INTO
-        User (Username, Password, Name, Email, Avatar, Bio, Link, CreatedAt, LastSeenAt)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """,
-        [
-            username,
-            hash_password(password, created_at),
-            name,
-            email,
-            avatar,
-            bio,
-            link,
-            created_at,
-            created_at,
-        ],
-    )
-    con.commit()
+    password_hash = await hash_password(password, created_at)
+
+    def insert(con: sqlite3.Connection) -> int | None:
+        return con.execute(
+            INSERT_USER,
+            [
+                username,
+                password_hash,
+                name,
+                email,
+                avatar,
+                bio,
+                link,
+                created_at,
+                created_at,
+            ],
+        ).lastrowid
+
+    try:
+        user_id = await write(insert)
+    except sqlite3.IntegrityError:
+        return False
+    if user_id is not None:
+        user_leaderboard.update(UserHandle(user_id, username, name, avatar, 0))
     return True
 
 
@@ -156,22 +180,18 @@ async def set_password(
     """Change password if old password is given, requires user be logged-in."""
     if PASSWORD.is_invalid(old_password) or PASSWORD.is_invalid(new_password):
         return False
-    con, cur = db()
-    cur.execute("SELECT Password FROM User WHERE ID = ?", [session.id])
-    user: Row | None = cur.fetchone()
+    async with db() as (_, cur):
+        user: Row | None = await cur.fetchone(USER_PASSWORD, [session.id])
     if user is None:
         msg = "User deleted while logged-in."
         raise ValueError(msg)
-    if not is_password_matching(user.Password, old_password, session.created_at):
+    if not await is_password_matching(user.Password, old_password, session.created_at):
         return False
-    cur.execute(
-        "UPDATE User SET Password = ? WHERE ID = ?",
-        [hash_password(new_password, session.created_at), session.id],
-    )
+    password_hash = await hash_password(new_password, session.created_at)
+    await write(lambda con: con.execute(UPDATE_PASSWORD, [password_hash, session.id]))
     if sessionid := credentials.get_session():
-        sessions.remove_by_sessionid(sessionid)
+        await session_store.delete(sessionid)
     credentials.set_session(None)
-    con.commit()
     return True
 
 
@@ -193,113 +213,64 @@ async def update_user(
         or BIO.is_invalid(bio)
     ):
         return
-    con, cur = db()
-    cur.execute(
-        """
-        UPDATE User SET Name = ?, Email = ?, Avatar = ?, Bio = ?, Link = ? WHERE ID = ?
-        """,
-        [name, email, avatar, bio, link, session.id],
-    )
-    con.commit()
+
+    def update(con: sqlite3.Connection) -> tuple[list[Row], list[UserHandle]]:
+        con.execute(UPDATE_USER, [name, email, avatar, bio, link, session.id])
+        return (
+            con.execute(FOUNDER_STARTUP_IDS, [session.id]).fetchall(),
+            fetchall_into(con.cursor(), UserHandle, USER_HANDLE, [session.id]),
+        )
+
+    startup_ids, handles = await write(update)
+    user_cache.invalidate(session.id)
+    user_leaderboard.update(*handles)
+    startup_cache.invalidate(*(row.Startup for row in startup_ids))
 
 
 @method
 async def follow_user(session: Session, user_id: int) -> None:
     """Follow a user."""
-    con, cur = db()
-    with contextlib.suppress(sqlite3.IntegrityError):
-        cur.execute(
-            """
-            INSERT INTO UserFollower (Follower, Following, CreatedAt) VALUES (?, ?, ?)
-            """,
-            [session.id, user_id, seconds_since_1970()],
-        )
-    con.commit()
+
+    def follow(con: sqlite3.Connection) -> list[UserHandle]:
+        with contextlib.suppress(sqlite3.IntegrityError):
+            con.execute(FOLLOW_USER, [session.id, user_id, seconds_since_1970()])
+            con.execute(BACKFILL_TIMELINE, [session.id, user_id, TIMELINE_BACKFILL])
+        return fetchall_into(con.cursor(), UserHandle, USER_HANDLE, [user_id])
+
+    handles = await write(follow)
+    if handles:
+        follow_graph.set_user(session.id, user_id, followed=True)
+    user_cache.invalidate(user_id)
+    user_leaderboard.update(*handles)
 
 
 @method
 async def unfollow_user(session: Session, user_id: int) -> None:
     """Unfollow a user."""
-    con, cur = db()
-    cur.execute(
-        "DELETE FROM UserFollower WHERE Follower = ? AND Following = ?",
-        [session.id, user_id],
-    )
-    con.commit()
 
+    def unfollow(con: sqlite3.Connection) -> list[UserHandle]:
+        con.execute(UNFOLLOW_USER, [session.id, user_id])
+        # Own posts stay on the timeline, following yourself only duplicates them.
+        if user_id != session.id:
+            con.execute(UNFOLLOW_TIMELINE, [session.id, user_id])
+        return fetchall_into(con.cursor(), UserHandle, USER_HANDLE, [user_id])
 
-@method
-async def get_user(session: Session | None, username: str) -> User | None:
-    """Get all information about user."""
-    _, cur = db()
-    cur.execute(
-        """
-        SELECT
-            ID,
-            Name,
-            Email,
-            Link,
-            Avatar,
-            Bio,
-            CreatedAt,
-            LastSeenAt,
-            (SELECT COUNT(ID) FROM UserFollower WHERE Following = User.ID)
-            FollowerCount,
-            (SELECT TRUE FROM UserFollower WHERE Follower = ? AND Following = User.ID)
-            IsFollowing
-        FROM User
-        WHERE Username = ?
-        """,
-        [session and session.id, username],
-    )
-    user: Row | None = cur.fetchone()
+    handles = await write(unfollow)
+    follow_graph.set_user(session.id, user_id, followed=False)
+    user_cache.invalidate(user_id)
+    user_leaderboard.update(*handles)
+
+
+async def load_user(username: str, cur: AsyncCursor) -> User | None:
+    """Read the viewer-independent parts of a user's page and cache them.
+
+    Polls are left as IsPoll flags and `followers` only carries the follower count.
+    """
+    generation = user_cache.generation
+    user: Row | None = await cur.fetchone(GET_USER, [username])
     if user is None:
         return None
-    cur.execute(
-        """
-        SELECT User.ID, Username, Name, Avatar, UserFollower.CreatedAt
-        FROM UserFollower
-        INNER JOIN User ON User.ID = Follower
-        WHERE
-            Following = ?
-            AND Follower IN (SELECT Following FROM UserFollower WHERE Follower = ?)
-        LIMIT 4
-        """,
-        [user.ID, session and session.id],
-    )
-    followers = cur.fetchall()
-    cur.execute(
-        """
-        SELECT ID, Title, Content, IsPoll, CreatedAt
-        FROM Blog
-        WHERE Author = ?
-        ORDER BY CreatedAt DESC
-        """,
-        [user.ID],
-    )
-    blogs = cur.fetchall()
-    cur.execute(
-        """
-        SELECT
-            Startup.ID,
-            Name,
-            Description,
-            Keynote,
-            Banner,
-            Founder.FoundedAt,
-            Startup.CreatedAt,
-            (SELECT COUNT(ID) FROM StartupFollower WHERE Startup = Startup.ID)
-            FollowerCount
-        FROM Startup
-        JOIN Founder
-        ON Startup = Startup.ID
-        WHERE Founder = ?
-        ORDER BY Founder.FoundedAt DESC
-        """,
-        [user.ID],
-    )
-    startups = cur.fetchall()
-    return User(
+    cached = User(
         id=user.ID,
         username=username,
         name=user.Name,
@@ -310,63 +281,55 @@ async def get_user(session: Session | None, username: str) -> User | None:
         created_at=user.CreatedAt,
         last_seen_at=user.LastSeenAt,
         followers=Followers(
-            mutuals=[
-                Follower(
-                    id=follower.ID,
-                    username=follower.Username,
-                    name=follower.Name,
-                    avatar=follower.Avatar,
-                    created_at=follower.CreatedAt,
+            mutuals=[], follower_count=user.FollowerCount, is_following=False
+        ),
+        blogs=await cur.fetchall_into(UserBlog, USER_BLOGS, [user.ID]),
+        startups=await cur.fetchall_into(UserStartup, USER_STARTUPS, [user.ID]),
+    )
+    user_ids.set(username, user.ID, user_ids.generation)
+    user_cache.set(user.ID, cached, generation)
+    return cached
+
+
+@method
+async def get_user(session: Session | None, username: str) -> User | None:
+    """Get all information about user."""
+    # Before checking out a connection, a refresh may wait for one of its own.
+    graph = await follow_graph.fresh()
+    async with db() as (_, cur):
+        user_id = user_ids.get(username)
+        user = None if user_id is None else user_cache.get(user_id)
+        if user is None:
+            user = await load_user(username, cur)
+            if user is None:
+                return None
+        is_following = False
+        mutuals = []
+        if session is not None:
+            is_following = graph.is_following_user(session.id, user.id)
+            if mutual_ids := graph.user_mutuals(user.id, session.id):
+                mutuals = await cur.fetchall_into(
+                    Follower, USER_MUTUALS, mutual_parameters(user.id, mutual_ids)
                 )
-                for follower in followers
-            ],
-            follower_count=user.FollowerCount,
-            is_following=bool(user.IsFollowing),
+        polls = await get_polls(
+            (blog.id for blog in user.blogs if blog.poll), session, cur
+        )
+    return replace(
+        user,
+        followers=Followers(
+            mutuals=mutuals,
+            follower_count=graph.user_followers.count(user.id),
+            is_following=is_following,
         ),
-        blogs=[
-            UserBlog(
-                id=blog.ID,
-                title=blog.Title,
-                content=blog.Content,
-                created_at=blog.CreatedAt,
-                poll=get_poll(blog.ID, session, cur) if blog.IsPoll else None,
-            )
-            for blog in blogs
-        ],
-        startups=[
-            UserStartup(
-                id=startup.ID,
-                name=startup.Name,
-                description=startup.Description,
-                keynote=startup.Keynote,
-                banner=startup.Banner,
-                created_at=startup.CreatedAt,
-                founded_at=startup.FoundedAt,
-                follower_count=startup.FollowerCount,
-            )
-            for startup in startups
-        ],
+        blogs=[replace(blog, poll=polls.get(blog.id)) for blog in user.blogs],
     )
 
 
 @method
 async def find_user(username: str) -> UserHandle | None:
     """Find user by username."""
-    _, cur = db()
-    cur.execute(
-        """
-        SELECT
-            ID,
-            Name,
-            Avatar,
-            (SELECT COUNT(ID) FROM UserFollower WHERE Following = User.ID)
-            FollowerCount
-        FROM User
-        WHERE Username = ?
-        """,
-        [username],
-    )
-    row: Row | None = cur.fetchone()
+    async with db() as (_, cur):
+        row: Row | None = await cur.fetchone(FIND_USER, [username])
     if row is None:
         return None
     return UserHandle(
@@ -379,30 +342,50 @@ async def find_user(username: str) -> UserHandle | None:
 
 
 @method
-async def top_users() -> list[UserHandle]:
-    """Return top users."""
-    _, cur = db()
-    cur.execute(
-        """
-        SELECT
-            ID,
-            Username,
-            Name,
-            Avatar,
-            (SELECT COUNT(ID) FROM UserFollower WHERE Following = User.ID)
-            FollowerCount
-        FROM User
-        ORDER BY FollowerCount DESC
-        LIMIT 5
-        """
+async def top_users(page: int) -> list[UserHandle]:
+    """Return a page of the most followed users."""
+    return await user_leaderboard.page(
+        page * LEADERBOARD_PAGE_SIZE, LEADERBOARD_PAGE_SIZE
     )
-    return [
-        UserHandle(
-            id=user.ID,
-            username=user.Username,
-            name=user.Name,
-            avatar=user.Avatar,
-            follower_count=user.FollowerCount,
+
+
+@method
+async def search_users(prefix: str) -> list[UserHandle]:
+    """Find the most followed users whose username or name starts with prefix."""
+    prefix = prefix.strip()
+    if not prefix or len(prefix) > MAX_PREFIX_LENGTH:
+        return []
+    if (handles := user_prefixes.get(prefix)) is not None:
+        return handles
+    generation = user_prefixes.generation
+    low, high = prefix_range(prefix)
+    async with db() as (_, cur):
+        handles = await cur.fetchall_into(
+            UserHandle,
+            SEARCH_USERS,
+            [
+                low,
+                high,
+                PREFIX_SEARCH_CANDIDATES,
+                low,
+                high,
+                PREFIX_SEARCH_CANDIDATES,
+                PREFIX_SEARCH_LIMIT,
+            ],
         )
-        for user in cur.fetchall()
+    user_prefixes.set(prefix, handles, generation)
+    return handles
+
+
+@method
+async def suggested_users(session: Session) -> list[UserHandle]:
+    """Return users to follow, precomputed by `rye run suggest`."""
+    async with db() as (_, cur):
+        handles = await cur.fetchall_into(UserHandle, SUGGESTED_USERS, [session.id])
+    # Drop users followed since the suggestions were computed.
+    graph = await follow_graph.fresh()
+    return [
+        handle
+        for handle in handles
+        if not graph.is_following_user(session.id, handle.id)
     ]
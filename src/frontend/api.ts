@@ -18,8 +18,20 @@ export async function post_blog(parameters: PostBlogParameters):Promise<MethodRe
 export async function delete_blog(parameters: DeleteBlogParameters):Promise<MethodResult<null>>{return await app.method('delete_blog', parameters);}
 /** Get all blog posts. */
 export async function get_blogs(parameters: GetBlogsParameters = {}):Promise<MethodResult<(Blog)[]>>{return await app.method('get_blogs', parameters);}
-/** Vote in a poll. */
+/** Get a page of blog posts, newest first, starting after cursor. */
+export async function get_blog_page(parameters: GetBlogPageParameters):Promise<MethodResult<BlogPage>>{return await app.method('get_blog_page', parameters);}
+/** Get a page of posts by followed users and self, newest first. */
+export async function get_timeline(parameters: GetTimelineParameters):Promise<MethodResult<BlogPage>>{return await app.method('get_timeline', parameters);}
+/** Search blog posts by title and content, most relevant first. */
+export async function search_blogs(parameters: SearchBlogsParameters):Promise<MethodResult<BlogSearchPage>>{return await app.method('search_blogs', parameters);}
+/** Vote in a poll, replacing any earlier vote. */
 export async function vote_poll(parameters: VotePollParameters):Promise<MethodResult<null>>{return await app.method('vote_poll', parameters);}
+/** Fails if startup is not founded by current user. */
+export async function add_founder(parameters: AddFounderParameters):Promise<MethodResult<null>>{return await app.method('add_founder', parameters);}
+/** Edit a founder. */
+export async function edit_founder(parameters: EditFounderParameters):Promise<MethodResult<null>>{return await app.method('edit_founder', parameters);}
+/** Remove a founder from a startup, only founders can remove other founders. */
+export async function remove_founder(parameters: RemoveFounderParameters):Promise<MethodResult<null>>{return await app.method('remove_founder', parameters);}
 /** Create a startup. */
 export async function create_startup(parameters: CreateStartupParameters):Promise<MethodResult<((number)|(null))>>{return await app.method('create_startup', parameters);}
 /** Only founders can delete startups. */
@@ -32,12 +44,10 @@ export async function get_startup(parameters: GetStartupParameters):Promise<Meth
 export async function follow_startup(parameters: FollowStartupParameters):Promise<MethodResult<null>>{return await app.method('follow_startup', parameters);}
 /** Unfollow a startup. */
 export async function unfollow_startup(parameters: UnfollowStartupParameters):Promise<MethodResult<null>>{return await app.method('unfollow_startup', parameters);}
-/** Fails if startup is not founded by current user. */
-export async function add_founder(parameters: AddFounderParameters):Promise<MethodResult<null>>{return await app.method('add_founder', parameters);}
-/** Edit a founder. */
-export async function edit_founder(parameters: EditFounderParameters):Promise<MethodResult<null>>{return await app.method('edit_founder', parameters);}
-/** Remove a founder from a startup, only founders can remove other founders. */
-export async function remove_founder(parameters: RemoveFounderParameters):Promise<MethodResult<null>>{return await app.method('remove_founder', parameters);}
+/** Return a page of the most followed startups. */
+export async function top_startups(parameters: TopStartupsParameters):Promise<MethodResult<(StartupHandle)[]>>{return await app.method('top_startups', parameters);}
+/** Find the most followed startups whose name starts with prefix. */
+export async function search_startups(parameters: SearchStartupsParameters):Promise<MethodResult<(StartupHandle)[]>>{return await app.method('search_startups', parameters);}
 /** Return session user. */
 export async function get_session(parameters: GetSessionParameters = {}):Promise<MethodResult<((Session)|(null))>>{return await app.method('get_session', parameters);}
 /** Login to account. */
@@ -58,17 +68,28 @@ export async function unfollow_user(parameters: UnfollowUserParameters):Promise<
 export async function get_user(parameters: GetUserParameters):Promise<MethodResult<((User)|(null))>>{return await app.method('get_user', parameters);}
 /** Find user by username. */
 export async function find_user(parameters: FindUserParameters):Promise<MethodResult<((UserHandle)|(null))>>{return await app.method('find_user', parameters);}
-/** Return top users. */
-export async function top_users(parameters: TopUsersParameters = {}):Promise<MethodResult<(UserHandle)[]>>{return await app.method('top_users', parameters);}
-export interface FollowStartupParameters{startup_id:number;}/** User handle. */
-export interface UserHandle{id:number;username:string;name:string;avatar:string;follower_count:number;}export interface EditFounderParameters{startup_id:number;founder_id:number;keynote:string;founded_at:number;}export interface UpdateUserParameters{name:string;email:string;avatar:string;bio:string;link:string;}export interface TopUsersParameters{}export interface DeleteStartupParameters{startup_id:number;}export interface DeleteBlogParameters{blog_id:number;}/** Blog post. */
-export interface Blog{author_id:number;username:string;name:string;avatar:string;follower_count:number;blog_id:number;title:string;content:string;poll:((Poll)|(null));created_at:number;}export interface LoginParameters{username:string;password:string;}export interface UnfollowUserParameters{user_id:number;}export interface GetBlogsParameters{}export interface GetStartupParameters{startup_id:number;}export interface RegisterParameters{username:string;password:string;name:string;email:string;avatar:string;bio:string;link:string;}export interface AddFounderParameters{startup_id:number;founder_id:number;keynote:string;founded_at:number;}export interface SetPasswordParameters{old_password:string;new_password:string;}export interface FindUserParameters{username:string;}export interface CreateStartupParameters{name:string;description:string;banner:string;founded_at:number;}/** Startup. */
-export interface Startup{id:number;name:string;description:string;banner:string;founded_at:number;created_at:number;founders:(Founder)[];followers:Followers;}/** User. */
-export interface User{id:number;username:string;name:string;email:string;avatar:string;link:string;bio:string;created_at:number;last_seen_at:number;followers:Followers;blogs:(UserBlog)[];startups:(UserStartup)[];}export interface RemoveFounderParameters{startup_id:number;founder_id:number;}export interface FollowUserParameters{user_id:number;}export interface UpdateStartupParameters{startup_id:number;name:string;description:string;banner:string;founded_at:number;}export interface GetSessionParameters{}export interface PostBlogParameters{title:string;content:string;poll_options:(((string)[])|(null));}export interface UnfollowStartupParameters{startup_id:number;}export interface GetUserParameters{username:string;}export interface LogoutParameters{}export interface VotePollParameters{blog_id:number;option_id:number;}/** Reproca session store. */
-export interface Session{id:number;username:string;name:string;email:string;avatar:string;link:string;bio:string;created_at:number;last_seen_at:number;}/** Poll. */
-export interface Poll{options:(PollOption)[];my_vote_id:((number)|(null));}export interface Followers{mutuals:(Follower)[];follower_count:number;is_following:boolean;}/** Startup founder. */
-export interface Founder{id:number;username:string;name:string;avatar:string;keynote:string;founded_at:number;follower_count:number;}/** Blog posted by user. */
+/** Return a page of the most followed users. */
+export async function top_users(parameters: TopUsersParameters):Promise<MethodResult<(UserHandle)[]>>{return await app.method('top_users', parameters);}
+/** Find the most followed users whose username or name starts with prefix. */
+export async function search_users(parameters: SearchUsersParameters):Promise<MethodResult<(UserHandle)[]>>{return await app.method('search_users', parameters);}
+/** Return users to follow, precomputed by `rye run suggest`. */
+export async function suggested_users(parameters: SuggestedUsersParameters = {}):Promise<MethodResult<(UserHandle)[]>>{return await app.method('suggested_users', parameters);}
+export interface PostBlogParameters{title:string;content:string;poll_options:(((string)[])|(null));}export interface DeleteBlogParameters{blog_id:number;}export interface GetBlogsParameters{}export interface GetBlogPageParameters{cursor:((string)|(null));limit:number;}export interface GetTimelineParameters{cursor:((string)|(null));}export interface SearchBlogsParameters{query:string;cursor:((string)|(null));}export interface VotePollParameters{blog_id:number;option_id:number;}export interface AddFounderParameters{startup_id:number;founder_id:number;keynote:string;founded_at:number;}export interface EditFounderParameters{startup_id:number;founder_id:number;keynote:string;founded_at:number;}export interface RemoveFounderParameters{startup_id:number;founder_id:number;}export interface CreateStartupParameters{name:string;description:string;banner:string;founded_at:number;}export interface DeleteStartupParameters{startup_id:number;}export interface UpdateStartupParameters{startup_id:number;name:string;description:string;banner:string;founded_at:number;}export interface GetStartupParameters{startup_id:number;}export interface FollowStartupParameters{startup_id:number;}export interface UnfollowStartupParameters{startup_id:number;}export interface TopStartupsParameters{page:number;}export interface SearchStartupsParameters{prefix:string;}export interface GetSessionParameters{}export interface LoginParameters{username:string;password:string;}export interface LogoutParameters{}export interface RegisterParameters{username:string;password:string;name:string;email:string;avatar:string;bio:string;link:string;}export interface SetPasswordParameters{old_password:string;new_password:string;}export interface UpdateUserParameters{name:string;email:string;avatar:string;bio:string;link:string;}export interface FollowUserParameters{user_id:number;}export interface UnfollowUserParameters{user_id:number;}export interface GetUserParameters{username:string;}export interface FindUserParameters{username:string;}export interface TopUsersParameters{page:number;}export interface SearchUsersParameters{prefix:string;}export interface SuggestedUsersParameters{}/** Blog post. */
+export interface Blog{author_id:number;username:string;name:string;avatar:string;follower_count:number;blog_id:number;title:string;content:string;poll:((Poll)|(null));created_at:number;}/** Poll. */
+export interface Poll{options:(PollOption)[];my_vote_id:((number)|(null));}/** Poll Option. */
+export interface PollOption{id:number;option:string;votes:number;}/** Page of blog posts. */
+export interface BlogPage{blogs:(Blog)[];next_cursor:((string)|(null));}/** Page of blog posts found by a search, most relevant first. */
+export interface BlogSearchPage{blogs:(BlogMatch)[];next_cursor:((string)|(null));}/** Blog post found by a search.
+
+Matched terms in `snippet` are wrapped in U+0002 and U+0003, so that the
+client can highlight them without rendering the post as HTML. */
+export interface BlogMatch{author_id:number;username:string;name:string;avatar:string;follower_count:number;blog_id:number;title:string;content:string;poll:((Poll)|(null));created_at:number;snippet:string;}/** Startup. */
+export interface Startup{id:number;name:string;description:string;banner:string;founded_at:number;created_at:number;founders:(Founder)[];followers:Followers;}/** Startup founder. */
+export interface Founder{id:number;username:string;name:string;avatar:string;keynote:string;founded_at:number;follower_count:number;}export interface Followers{mutuals:(Follower)[];follower_count:number;is_following:boolean;}/** Follower or following. */
+export interface Follower{id:number;username:string;name:string;avatar:string;created_at:number;}/** Startup handle. */
+export interface StartupHandle{id:number;name:string;banner:string;follower_count:number;}/** Reproca session store. */
+export interface Session{id:number;username:string;name:string;email:string;avatar:string;link:string;bio:string;created_at:number;last_seen_at:number;}/** User. */
+export interface User{id:number;username:string;name:string;email:string;avatar:string;link:string;bio:string;created_at:number;last_seen_at:number;followers:Followers;blogs:(UserBlog)[];startups:(UserStartup)[];}/** Blog posted by user. */
 export interface UserBlog{id:number;title:string;content:string;poll:((Poll)|(null));created_at:number;}/** User startup. */
-export interface UserStartup{id:number;name:string;description:string;keynote:string;banner:string;founded_at:number;created_at:number;follower_count:number;}/** Poll Option. */
-export interface PollOption{id:number;option:string;votes:number;}/** Follower or following. */
-export interface Follower{id:number;username:string;name:string;avatar:string;created_at:number;}
\ No newline at end of file
+export interface UserStartup{id:number;name:string;description:string;keynote:string;banner:string;founded_at:number;created_at:number;follower_count:number;}/** User handle. */
+export interface UserHandle{id:number;username:string;name:string;avatar:string;follower_count:number;}
\ No newline at end of file
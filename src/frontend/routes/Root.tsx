@@ -5,7 +5,7 @@ import {UserHandle} from "~/components/UserHandle"
 import {QueryType, useMutation, useQuery} from "~/query"
 
 export function Root() {
-    const [users] = useQuery(api.top_users)
+    const [users] = useQuery(() => api.top_users({page: 0}))
     const [blogs, fetchBlogs] = useQuery(api.get_blogs)
     const deleteBlog = useMutation(blogs, fetchBlogs, api.delete_blog, {
         update: (signal, {blog_id}) => {
@@ -0,0 +1,82 @@
+"""Tests of the slow query log."""
+
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+os.environ.setdefault("DATABASE", ":memory:")
+
+from backend import slow_queries  # noqa: E402
+from backend.db import connect  # noqa: E402
+from backend.metrics import RequestStats  # noqa: E402
+from backend.statements import Statement  # noqa: E402
+
+
+class SlowQueryLogTest(unittest.TestCase):
+    """Entries are encoded and written by a single listener."""
+
+    def setUp(self) -> None:
+        """Log to a temporary file."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / "slow_queries.log"
+        self.original = slow_queries.SLOW_QUERY_LOG
+        slow_queries.SLOW_QUERY_LOG = str(self.path)
+        self.addCleanup(self.stop)
+
+    def stop(self) -> None:
+        """Stop the listener and detach its handler."""
+        if slow_queries.listener is not None:
+            slow_queries.listener.stop()
+            atexit.unregister(slow_queries.listener.stop)
+            for handler in slow_queries.listener.handlers:
+                handler.close()
+            slow_queries.listener = None
+        for handler in slow_queries.logger.handlers[:]:
+            slow_queries.logger.removeHandler(handler)
+        slow_queries.SLOW_QUERY_LOG = self.original
+
+    def entries(self) -> list[dict[str, object]]:
+        """Flush the listener and return the logged entries."""
+        self.stop()
+        with self.path.open() as file:
+            return [json.loads(line) for line in file]
+
+    def test_statement(self) -> None:
+        """A registered `Statement` is logged with its name and SQL text."""
+        sql = Statement("test_select", "SELECT ? AS value", scan=False)
+        con = connect(":memory:")
+        self.addCleanup(con.close)
+        slow_queries.log(con, sql, [1], 1, 0.5, RequestStats("get_user"))
+        [entry] = self.entries()
+        assert entry["statement"] == "test_select"
+        assert entry["sql"] == "SELECT ? AS value"
+        assert entry["endpoint"] == "get_user"
+        assert entry["parameters"] == ["int"]
+
+    def test_write(self) -> None:
+        """A slow write is logged without SQL text."""
+        slow_queries.log_write("follow", 2, 0.5, 0.25, None)
+        [entry] = self.entries()
+        assert entry["write"] == "follow"
+        assert entry["statements"] == 2  # noqa: PLR2004
+        assert "sql" not in entry
+
+    def test_start_once(self) -> None:
+        """Threads starting the log at once attach a single handler."""
+        threads = [threading.Thread(target=slow_queries.start) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(slow_queries.logger.handlers) == 1
+
+
+if __name__ == "__main__":
+    unittest.main()